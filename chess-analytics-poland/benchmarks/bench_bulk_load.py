@@ -0,0 +1,86 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from archive_store import iter_archive_games
+from bulk_load import COPY_CHUNK_SIZE, copy_rows, ensure_table
+from connection_to_database import LOAD_CHUNK_SIZE, engine
+from games import batched, build_game_rows
+from schema import FACT_COLUMNS, PGN_COLUMNS, RAW_COLUMNS
+
+TO_SQL_TABLE = "bench_games_to_sql"
+COPY_TABLE = "bench_games_copy"
+# The row fields the loader stores (opening_id is looked up later); parse-only ones are left out
+STORED_COLUMNS = list(dict.fromkeys([*FACT_COLUMNS, *PGN_COLUMNS, *RAW_COLUMNS]))
+
+
+def corpus(archives, size):
+    """Builds `size` game rows by cycling through saved archives, with the IDs made unique."""
+    rows = [row for filename in archives for row in build_game_rows(iter_archive_games(filename))]
+    if not rows:
+        raise SystemExit("The archives hold no games.")
+    corpus_rows = []
+    for i, row in enumerate(itertools.islice(itertools.cycle(rows), size)):
+        row = {column: row[column] for column in STORED_COLUMNS}
+        corpus_rows.append(dict(row, game_id=f"{row['game_id']}-{i}"))
+    return corpus_rows
+
+
+def drop(table):
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+
+def load_to_sql(rows):
+    """The previous path: DataFrame.to_sql, one chunk per transaction as the loader did."""
+    for chunk in batched(rows, LOAD_CHUNK_SIZE):
+        with engine.begin() as connection:
+            pd.DataFrame(chunk).to_sql(TO_SQL_TABLE, connection, if_exists='append', index=False)
+
+
+def load_copy(rows, chunk_size):
+    """The COPY path, in one transaction."""
+    with engine.begin() as connection:
+        ensure_table(connection, COPY_TABLE, rows[:chunk_size])
+        copy_rows(connection, COPY_TABLE, rows, chunk_size=chunk_size)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Insert throughput of DataFrame.to_sql vs COPY FROM STDIN.")
+    parser.add_argument("archives", nargs="+", help="saved archive files to build the corpus from")
+    parser.add_argument("--games", type=int, default=50000, help="corpus size (default: 50000)")
+    parser.add_argument("--chunk-size", type=int, default=COPY_CHUNK_SIZE, help="rows per COPY statement")
+    args = parser.parse_args()
+
+    rows = corpus(args.archives, args.games)
+    print(f"Corpus: {len(rows)} games, {sum(len(row['pgn']) for row in rows) / 1e6:.1f} MB of PGN")
+
+    for table in (TO_SQL_TABLE, COPY_TABLE):
+        drop(table)
+    try:
+        to_sql_s = timed(load_to_sql, rows)
+        copy_s = timed(load_copy, rows, args.chunk_size)
+        with engine.connect() as connection:
+            for table in (TO_SQL_TABLE, COPY_TABLE):
+                count = connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                assert count == len(rows), f"{table} holds {count} rows, expected {len(rows)}"
+    finally:
+        for table in (TO_SQL_TABLE, COPY_TABLE):
+            drop(table)
+
+    print(f"{'path':<10} {'seconds':>8} {'games/sec':>10}")
+    print(f"{'to_sql':<10} {to_sql_s:>8.2f} {len(rows) / to_sql_s:>10.0f}")
+    print(f"{'copy':<10} {copy_s:>8.2f} {len(rows) / copy_s:>10.0f}")
+    print(f"COPY is {to_sql_s / copy_s:.1f}x faster")
@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from bench_pgn_headers import corpus
+from moves import parse_movetext_batch
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move-text parsing into SAN and clock arrays: one process vs a pool.")
+    parser.add_argument("archives", nargs="+", help="saved archive files to build the corpus from")
+    parser.add_argument("--games", type=int, default=47000, help="corpus size (default: 47000, hikaru's archive)")
+    parser.add_argument("--workers", type=int, default=0, help="pool processes (default: one per core)")
+    args = parser.parse_args()
+
+    pgns = corpus(args.archives, args.games)
+    serial_s, serial = timed(parse_movetext_batch, pgns)
+    pool_s, pooled = timed(parse_movetext_batch, pgns, args.workers)
+    if pooled != serial:
+        raise SystemExit("The pool parsed the games differently.")
+
+    moves = sum(len(san) for san, _ in serial)
+    movetext_bytes = sum(len(pgn) - pgn.find("\n\n") for pgn in pgns)
+    print(f"Corpus: {len(pgns)} PGNs, {moves} moves, {movetext_bytes / 1e6:.1f} MB of move text")
+    print(f"{'path':<10} {'seconds':>8} {'moves/sec':>11}")
+    for name, seconds in (("serial", serial_s), (f"pool ({args.workers or os.cpu_count()})", pool_s)):
+        print(f"{name:<10} {seconds:>8.2f} {moves / seconds:>11.0f}")
+    print(f"Clocks as packed int32: {moves * 4 / 1e6:.1f} MB")
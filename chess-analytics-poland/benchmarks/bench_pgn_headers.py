@@ -0,0 +1,79 @@
+import argparse
+import datetime
+import itertools
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from archive_store import iter_archive_games
+from games import SCORES, parse_pgn_headers_batch, pgn_date
+
+# The previous per-field expressions: each one scans the PGN on its own, and the MULTILINE
+# ones run on through the whole move text
+OLD_DATE_PATTERN = re.compile(r'\[Date "(\d{4}\.\d{1,2}\.\d{1,2})"\]', re.IGNORECASE)
+OLD_RESULT_PATTERN = re.compile(r'^\[Result "([^"]*)"\]', re.MULTILINE)
+OLD_HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$', re.MULTILINE)
+
+
+def corpus(archives, size):
+    """Returns `size` PGNs, cycling through the games of saved archives."""
+    pgns = [game["pgn"] for filename in archives for game in iter_archive_games(filename) if "pgn" in game]
+    if not pgns:
+        raise SystemExit("The archives hold no PGNs.")
+    return list(itertools.islice(itertools.cycle(pgns), size))
+
+
+def per_field(pgns):
+    """The previous ingest path: date, result and the Parquet header columns, one regex each."""
+    out = []
+    for pgn in pgns:
+        date = OLD_DATE_PATTERN.search(pgn)
+        date = datetime.datetime.strptime(date.group(1), '%Y.%m.%d').date().strftime('%Y-%m-%d') if date else None
+        result = OLD_RESULT_PATTERN.search(pgn)
+        headers = dict(OLD_HEADER_PATTERN.findall(pgn))
+        out.append((date, SCORES.get(result and result.group(1)), headers))
+    return out
+
+
+def single_pass(pgns):
+    """Every header parsed once, date and result read from the parsed tags."""
+    return [(pgn_date(headers), SCORES.get(headers.get("Result")), headers) for headers in parse_pgn_headers_batch(pgns)]
+
+
+def headers_only_old(pgns):
+    return [dict(OLD_HEADER_PATTERN.findall(pgn)) for pgn in pgns]
+
+
+def best_of(runs, func, *args):
+    best, result = float("inf"), None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PGN header parsing: one regex per field vs the single-pass tokenizer.")
+    parser.add_argument("archives", nargs="+", help="saved archive files to build the corpus from")
+    parser.add_argument("--games", type=int, default=47000, help="corpus size (default: 47000, hikaru's archive)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per path; the fastest is shown")
+    args = parser.parse_args()
+
+    pgns = corpus(args.archives, args.games)
+    print(f"Corpus: {len(pgns)} PGNs, {sum(map(len, pgns)) / 1e6:.1f} MB")
+
+    old_s, old = best_of(args.runs, per_field, pgns)
+    new_s, new = best_of(args.runs, single_pass, pgns)
+    old_headers_s, _ = best_of(args.runs, headers_only_old, pgns)
+    new_headers_s, _ = best_of(args.runs, parse_pgn_headers_batch, pgns)
+    mismatched = sum(old_row != new_row for old_row, new_row in zip(old, new))
+
+    print(f"{'path':<28} {'seconds':>8} {'games/sec':>10}")
+    for name, seconds in (("per-field (date+result+all)", old_s), ("single-pass", new_s),
+                          ("all headers: findall", old_headers_s), ("all headers: tokenizer", new_headers_s)):
+        print(f"{name:<28} {seconds:>8.2f} {len(pgns) / seconds:>10.0f}")
+    print(f"Ingest header work is {old_s / new_s:.1f}x faster ({new_headers_s and old_headers_s / new_headers_s:.1f}x "
+          f"for the headers alone); {mismatched} games parsed differently")
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import analyze_data
+from db import engine
+from rebuild_from_archives import rebuild
+from schema import migrate
+from summaries import check_summaries
+
+# Reports timed after the load, as analyze_data runs them
+REPORTS = {
+    "avg_ratings": lambda player: analyze_data.avg_ratings(),
+    "game_counts": lambda player: analyze_data.game_counts(),
+    "win_rates": lambda player: analyze_data.win_rates(),
+    "player_games": analyze_data.player_games,
+}
+
+
+def best_of(runs, func, *args):
+    """Returns (fastest seconds, last result) over `runs` calls."""
+    best, result = float("inf"), None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times the offline pipeline (load from saved archives, then the reports) on the "
+                    "database in CHESS_DB_URL, e.g. sqlite:///bench.db on a machine without PostgreSQL."
+    )
+    parser.add_argument("--data-root", default=os.getcwd(), help="directory holding the {player}/ archive folders")
+    parser.add_argument("--player", default="hikaru", help="player for the per-player report")
+    parser.add_argument("--runs", type=int, default=5, help="runs per report; the fastest is shown")
+    parser.add_argument("--dump", help="directory to write each report to as CSV, to diff two backends")
+    args = parser.parse_args()
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    migrate(engine)
+    load_s, _ = best_of(1, rebuild, args.data_root, None, None, True)
+    with engine.connect() as connection:
+        check_s, mismatches = best_of(1, check_summaries, connection)
+    if any(mismatches.values()):
+        raise SystemExit(f"Summaries differ from a full scan: {mismatches}")
+
+    print(f"{'step':<15} {'ms':>10} {'rows':>8}")
+    print(f"{'load':<15} {load_s * 1000:>10.1f}")
+    print(f"{'check':<15} {check_s * 1000:>10.1f}")
+    if args.dump:
+        os.makedirs(args.dump, exist_ok=True)
+    for name, report in REPORTS.items():
+        report_s, df = best_of(args.runs, report, args.player)
+        print(f"{name:<15} {report_s * 1000:>10.2f} {len(df):>8}")
+        if args.dump:
+            df.to_csv(os.path.join(args.dump, f"{name}.csv"), index=False)
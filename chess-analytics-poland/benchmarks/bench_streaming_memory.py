@@ -0,0 +1,68 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from archive_store import iter_archive_games, open_archive, write_archive
+from connection_to_database import LOAD_CHUNK_SIZE
+from games import batched, build_game_rows
+
+
+def load_whole(filename):
+    """The previous path: parse the full payload, build every row, then one DataFrame."""
+    with open_archive(filename) as f:
+        data = json.loads(f.read())
+    games = data.get("games", []) if isinstance(data, dict) else data
+    rows = list(build_game_rows(games))
+    return len(pd.DataFrame(rows))
+
+
+def load_streaming(filename):
+    """The streaming path: one game at a time into the row builder, one chunk at a time into a DataFrame."""
+    count = 0
+    for chunk in batched(build_game_rows(iter_archive_games(filename)), LOAD_CHUNK_SIZE):
+        count += len(pd.DataFrame(chunk))
+    return count
+
+
+def measure(func, filename):
+    """Returns (games, seconds, peak MB) of one run."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(filename)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / (1024 * 1024)
+
+
+def inflate(filename, repeat, tmp_dir):
+    """Writes a copy of an archive with its games repeated, to simulate a hyperactive month."""
+    games = list(iter_archive_games(filename))
+    return write_archive(os.path.join(tmp_dir, "bench_games_2000_01"), games * repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of whole-payload vs streaming archive parsing.")
+    parser.add_argument("archives", nargs="+", help="saved archive files")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat each archive's games this many times")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'archive':<40} {'games':>8} {'whole MB':>10} {'stream MB':>10} {'whole s':>8} {'stream s':>9}")
+        for filename in args.archives:
+            path = inflate(filename, args.repeat, tmp_dir) if args.repeat > 1 else filename
+            games, whole_s, whole_mb = measure(load_whole, path)
+            _, stream_s, stream_mb = measure(load_streaming, path)
+            print(
+                f"{os.path.basename(filename):<40} {games:>8} {whole_mb:>10.1f} {stream_mb:>10.1f} "
+                f"{whole_s:>8.2f} {stream_s:>9.2f}"
+            )
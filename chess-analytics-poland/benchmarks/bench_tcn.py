@@ -0,0 +1,44 @@
+import argparse
+import itertools
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from archive_store import iter_archive_games
+from bench_pgn_headers import best_of
+from moves import decode_tcn_batch, parse_movetext_batch
+
+
+def corpus(archives, size):
+    """Returns `size` (pgn, tcn) pairs, cycling through the games of saved archives."""
+    games = [
+        (game["pgn"], game["tcn"])
+        for filename in archives
+        for game in iter_archive_games(filename)
+        if "pgn" in game and "tcn" in game
+    ]
+    if not games:
+        raise SystemExit("The archives hold no games with both a PGN and a TCN.")
+    return list(itertools.islice(itertools.cycle(games), size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move arrays from the TCN field vs parsing the PGN move text.")
+    parser.add_argument("archives", nargs="+", help="saved archive files to build the corpus from")
+    parser.add_argument("--games", type=int, default=47000, help="corpus size (default: 47000, hikaru's archive)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per path; the fastest is shown")
+    args = parser.parse_args()
+
+    pgns, tcns = zip(*corpus(args.archives, args.games))
+    pgn_s, parsed = best_of(args.runs, parse_movetext_batch, pgns)
+    tcn_s, (offsets, *_) = best_of(args.runs, decode_tcn_batch, tcns)
+    mismatched = int(np.count_nonzero(np.diff(offsets) != [len(san) for san, _ in parsed]))
+
+    moves = int(offsets[-1])
+    print(f"Corpus: {len(pgns)} games, {moves} moves")
+    print(f"{'path':<16} {'seconds':>8} {'moves/sec':>11}")
+    for name, seconds in (("PGN move text", pgn_s), ("TCN (numpy)", tcn_s)):
+        print(f"{name:<16} {seconds:>8.3f} {moves / seconds:>11.0f}")
+    print(f"TCN decoding is {pgn_s / tcn_s:.0f}x faster; {mismatched} games differ in move count")
@@ -1,60 +1,63 @@
+import argparse
 import sys
 import os
 import subprocess
 
+# The pipeline steps run in this process, so they share one database connection pool
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+import analyze_data
+from connection_to_database import process_player_games
+from roster import build_roster, ingest_roster
+
+def run_roster(args):
+    """Ingests a whole roster without prompting, then runs the analysis."""
+    print("🔍 Fetching game data for the roster and updating database...")
+    roster = build_roster(args.players, args.roster_file, args.discover, args.country)
+    ingest_roster(roster, args.workers)
+    print("✅ Database updated for the roster.")
+
+    print("\n📊 Analyzing data...")
+    analyze_data.main()
+    print("✅ Analysis complete.")
+
+    print("\n✨ Project workflow complete.")
+
 def main():
+    parser = argparse.ArgumentParser(description="Chess.com analytics workflow (interactive without arguments).")
+    parser.add_argument("--players", nargs="+", default=[], help="usernames to ingest without prompting")
+    parser.add_argument("--roster-file", help="file with one username per line")
+    parser.add_argument("--discover", action="store_true", help="ingest every titled player from --country")
+    parser.add_argument("--country", default="PL", help="ISO country code for --discover (default: PL)")
+    parser.add_argument("--workers", type=int, default=4, help="players ingested concurrently")
+    args = parser.parse_args()
+    if args.players or args.roster_file or args.discover:
+        run_roster(args)
+        return
+
     username = input("Enter the Chess.com username to process: ").strip().lower()
     data_folder = username
 
     scripts_dir = os.path.dirname(os.path.abspath(__file__))
-    root_dir = scripts_dir
 
-    fetch_data_path = os.path.join(scripts_dir, "scripts", "fetch_data.py")  # Added "scripts"
-    dates_path = os.path.join(scripts_dir, "data", "dates.py")            # Added "scripts"
-    extract_dates_db_path = os.path.join(root_dir, "scripts", "connection_to_database.py")
-    analyze_data_path = os.path.join(scripts_dir, "scripts", "analyze_data.py")  # Added "scripts"
     visualize_path = os.path.join(scripts_dir, "scripts", "visualize.py")   # Added "scripts"
-    connection_to_db_path = os.path.join(scripts_dir, "scripts", "connection_to_database.py")  # Added connection_to_database.py
 
     # Debugging paths (you can comment this out when not needed)
     # print("--- Path Debugging ---")
     # print(f"Scripts Directory: {scripts_dir}")
-    # print(f"Root Directory: {root_dir}")
-    # print(f"Fetch Data Path: {fetch_data_path}")
-    # print(f"Dates Path: {dates_path}")
-    # print(f"Extract Dates DB Path: {extract_dates_db_path}")
-    # print(f"Analyze Data Path: {analyze_data_path}")
     # print(f"Visualize Path: {visualize_path}")
-    # print(f"Connection to DB Path: {connection_to_db_path}")
     # print("----------------------")
 
-    # Step 1: Fetch game data and update the database
+    # Step 1: Fetch each archive once and insert its games, dates included, into the database
     print(f"🔍 Fetching game data for {username} and updating database...")
-    subprocess.run([sys.executable, fetch_data_path, username])
-    print("✅ Game data fetching and initial database update complete.")
-
-    # Step 2: Insert data into the database (connection_to_database.py)
-    print(f"\n🔄 Inserting data into the database for {username}...")
-    subprocess.run([sys.executable, connection_to_db_path, username])
-    print("✅ Database updated with fetched game data.")
-
-    # Step 3: Extract dates from PGNs for further analysis
-    print(f"\n🗓️ Extracting dates from PGNs for {username}...")
-    subprocess.run([sys.executable, dates_path, username])  # 👈 add username
-    print("✅ Date extraction complete. Dates saved to data/extracted_dates.csv")
-
-    # Step 4: Update the database with the extracted dates
-    print("\n🔄 Updating database with extracted dates...")
-    subprocess.run([sys.executable, extract_dates_db_path, username])  # 👈 add username
-    print("✅ Database updated with extracted dates.")
-
+    process_player_games(username)
+    print("✅ Database updated with fetched game data and dates.")
 
-    # Step 5: Analyze data
+    # Step 2: Analyze data
     print(f"\n📊 Analyzing data for {username}...")
-    subprocess.run([sys.executable, analyze_data_path, username, data_folder])
+    analyze_data.main(username)
     print("✅ Analysis complete.")
 
-    # Step 6: Visualize data
+    # Step 3: Visualize data
     print(f"\n📈 Visualizing data for {username}...")
     subprocess.run([sys.executable, visualize_path, username, data_folder])
     print("✅ Visualization complete.")
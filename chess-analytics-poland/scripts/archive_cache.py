@@ -0,0 +1,99 @@
+import datetime
+import json
+import logging
+import os
+import threading
+
+from archive_store import archive_suffix, find_archive
+from chess_api import archive_month
+
+VALIDATORS_FILENAME = "validators.json"
+
+
+class ValidatorStore:
+    """Per-URL ETag / Last-Modified validators, persisted as JSON next to a player's archives."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.validators = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.validators = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable validator store {path}: {e}")
+
+    def __contains__(self, url):
+        return url in self.validators
+
+    def conditional_headers(self, url):
+        """Returns the If-None-Match / If-Modified-Since headers to revalidate a URL."""
+        with self.lock:
+            entry = self.validators.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url, response):
+        """Records the validators of a successful (200) response."""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with self.lock:
+            if etag or last_modified:
+                self.validators[url] = {"etag": etag, "last_modified": last_modified}
+            else:
+                self.validators.pop(url, None)
+
+    def forget(self, url):
+        """Drops the validators of a URL whose cached copy is gone."""
+        with self.lock:
+            self.validators.pop(url, None)
+
+    def save(self):
+        """Writes the store back to disk."""
+        with self.lock:
+            data = dict(self.validators)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def archive_filename(data_dir, player_name, archive_url):
+    """Returns the local file an archive URL is cached in."""
+    year, month = archive_month(archive_url)
+    return os.path.join(data_dir, f"{player_name}_games_{year}_{month}{archive_suffix()}")
+
+
+def archive_is_complete(archive_url, filename):
+    """True if the cached file was written after the archive's month ended, so it cannot have grown since."""
+    year, month = (int(part) for part in archive_month(archive_url))
+    month_end = datetime.datetime(year + month // 12, month % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+    written = datetime.datetime.fromtimestamp(os.path.getmtime(filename), tz=datetime.timezone.utc)
+    return written >= month_end
+
+
+def load_validators(data_dir):
+    """Opens the validator store of a player's data directory."""
+    return ValidatorStore(os.path.join(data_dir, VALIDATORS_FILENAME))
+
+
+def plan_refresh(archive_urls, data_dir, player_name, validators):
+    """Returns {archive_url: filename} for the archives that need a (possibly conditional) request."""
+    pending = {}
+    for archive_url in archive_urls:
+        filename = archive_filename(data_dir, player_name, archive_url)
+        cached = find_archive(filename)
+        if cached is None:
+            # Nothing to revalidate against, so ask for the full archive
+            validators.forget(archive_url)
+        elif archive_url not in validators and archive_is_complete(archive_url, cached):
+            # Downloaded before validators were recorded, but after the month closed
+            logging.info(f"Archive {cached} already downloaded, skipping...")
+            continue
+        pending[archive_url] = filename
+    return pending
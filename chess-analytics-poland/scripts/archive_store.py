@@ -0,0 +1,268 @@
+import argparse
+import datetime
+import glob
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from json_stream import iter_json_array
+
+# The [Date "YYYY.MM.DD"] header inside a game's JSON-escaped PGN, and the longest it can be
+DATE_HEADER_PATTERN = re.compile(rb'\[[Dd][Aa][Tt][Ee] \\"(\d{4})\.(\d{1,2})\.')
+DATE_HEADER_LENGTH = 32
+
+# Compression for newly written archives: "gzip", or "zstd" when zstandard is installed
+ARCHIVE_COMPRESSION = "gzip"
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# Known on-disk formats, preferred first; plain .json is the legacy indent=4 format
+ARCHIVE_SUFFIXES = (".json.zst", ".json.gz", ".json")
+
+
+def archive_suffix():
+    """Returns the file suffix new archives are written with."""
+    if ARCHIVE_COMPRESSION == "zstd":
+        if zstandard is None:
+            raise RuntimeError("ARCHIVE_COMPRESSION is 'zstd' but the zstandard package is not installed")
+        return ".json.zst"
+    return ".json.gz"
+
+
+def archive_stem(filename):
+    """Strips any known archive suffix from a path."""
+    for suffix in ARCHIVE_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def find_archive(filename):
+    """Returns the existing file holding the same archive as `filename` in any format, or None."""
+    stem = archive_stem(filename)
+    for suffix in ARCHIVE_SUFFIXES:
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def open_archive(filename):
+    """Opens an archive for reading as a decompressed binary stream."""
+    if filename.endswith(".json.zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Cannot read {filename}: the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True)
+    if filename.endswith(".gz"):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def encode_archive(games, filename):
+    """Returns compact JSON for the games, compressed in the format the suffix of `filename` names."""
+    payload = json.dumps(games, separators=(',', ':')).encode('utf-8')
+    if filename.endswith(".json.zst"):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    return gzip.compress(payload, compresslevel=GZIP_LEVEL)
+
+
+def install_archive(tmp_path, path):
+    """Moves a fully written archive into place and removes copies of the same month in other formats."""
+    os.replace(tmp_path, path)
+    stem = archive_stem(path)
+    for suffix in ARCHIVE_SUFFIXES:
+        if stem + suffix != path and os.path.exists(stem + suffix):
+            os.remove(stem + suffix)
+    return path
+
+
+def write_archive(filename, games):
+    """Saves the games of one monthly archive as compact, compressed JSON.
+
+    The suffix of `filename` is replaced with the configured format's, and copies of the
+    same month in other formats are removed. Returns the path written.
+    """
+    path = archive_stem(filename) + archive_suffix()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_archive(games, path))
+    return install_archive(tmp_path, path)
+
+
+def write_archive_stream(filename, chunks):
+    """Saves a raw API payload, given as byte chunks, compressed without holding it in memory.
+
+    Like write_archive, the configured format's suffix is used and other copies are removed.
+    Returns the path written.
+    """
+    path = archive_stem(filename) + archive_suffix()
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as raw:
+            if path.endswith(".json.zst"):
+                f = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+            else:
+                f = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL)
+            with f:
+                for chunk in chunks:
+                    f.write(chunk)
+    except BaseException:
+        # A broken download or compressor leaves no partial file behind
+        os.remove(tmp_path)
+        raise
+    return install_archive(tmp_path, path)
+
+
+class HashingReader:
+    """Wraps a binary stream, feeding everything read from it through a hash."""
+
+    def __init__(self, stream, digest):
+        self.stream = stream
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        return data
+
+
+def iter_archive_games(filename, digest=None):
+    """Yields the games of one monthly archive one at a time, keeping memory flat for huge months.
+
+    With `digest` (a hashlib object), the decompressed content is hashed as it is read;
+    the hash is complete once the generator is exhausted.
+    """
+    with open_archive(filename) as f:
+        if digest is None:
+            yield from iter_json_array(f, "games")
+            return
+        reader = HashingReader(f, digest)
+        yield from iter_json_array(reader, "games")
+        while reader.read(64 * 1024):
+            pass  # hash whatever follows the games array too
+
+
+def archive_digest(filename):
+    """Returns the SHA-256 of an archive's decompressed content, as iter_archive_games computes it."""
+    digest = hashlib.sha256()
+    with open_archive(filename) as f:
+        while True:
+            data = f.read(1024 * 1024)
+            if not data:
+                return digest.hexdigest()
+            digest.update(data)
+
+
+def archive_months(filename):
+    """Returns the first day of every month a game of the archive is dated in, by its PGN Date header.
+
+    A regex over the decompressed bytes, without parsing the JSON, so loaders can prepare the
+    months up front: daily games are dated by their start, often months before the archive's.
+    """
+    months = set()
+    tail = b""
+    with open_archive(filename) as f:
+        while True:
+            data = f.read(1024 * 1024)
+            if not data:
+                return months
+            data = tail + data
+            for year, month in DATE_HEADER_PATTERN.findall(data):
+                if 1 <= int(month) <= 12:
+                    months.add(datetime.date(int(year), int(month), 1))
+            # A header cut by the chunk boundary is matched again with the next chunk
+            tail = data[-DATE_HEADER_LENGTH:]
+
+
+def read_archive(filename):
+    """Loads the games of one monthly archive, whatever format and script wrote it."""
+    with open_archive(filename) as f:
+        data = json.load(io.TextIOWrapper(f, encoding='utf-8'))
+    # fetch_data.py used to keep the raw API payload, connection_to_database.py just the games list
+    return data.get("games", []) if isinstance(data, dict) else data
+
+
+def list_archives(data_dir):
+    """Returns the archive files saved in a player's data directory, one per month, oldest first."""
+    archives = {}
+    for suffix in reversed(ARCHIVE_SUFFIXES):
+        for filename in glob.glob(os.path.join(data_dir, f"*_games_*_*{suffix}")):
+            # Later (preferred) formats win when a month exists twice
+            archives[archive_stem(filename)] = filename
+    return [archives[stem] for stem in sorted(archives)]
+
+
+def time_reads(filenames):
+    """Reads archives back to back, returning (seconds, games read)."""
+    start = time.perf_counter()
+    games = sum(len(read_archive(filename)) for filename in filenames)
+    return time.perf_counter() - start, games
+
+
+def migrate(data_dirs, keep=False):
+    """Rewrites legacy .json archives in the compressed format and reports the savings."""
+    legacy = [
+        f for data_dir in data_dirs for f in list_archives(data_dir)
+        if f.endswith(".json")
+    ]
+    if not legacy:
+        logging.info("No legacy .json archives to migrate.")
+        return
+
+    bytes_before = sum(os.path.getsize(f) for f in legacy)
+    old_seconds, game_count = time_reads(legacy)
+
+    migrated = []
+    for filename in legacy:
+        games = read_archive(filename)
+        written = os.stat(filename)
+        if keep:
+            # Write next to the original instead of replacing it
+            path = archive_stem(filename) + archive_suffix()
+            with open(path, 'wb') as f:
+                f.write(encode_archive(games, path))
+        else:
+            path = write_archive(filename, games)
+        if read_archive(path) != games:
+            raise RuntimeError(f"Round trip mismatch for {filename}")
+        # Keep the original write time; archive_cache uses it to tell complete months apart
+        os.utime(path, (written.st_atime, written.st_mtime))
+        migrated.append(path)
+
+    bytes_after = sum(os.path.getsize(f) for f in migrated)
+    new_seconds, _ = time_reads(migrated)
+
+    mb = 1024 * 1024
+    logging.info(f"Migrated {len(migrated)} archives ({game_count} games).")
+    logging.info(
+        f"Size: {bytes_before / mb:.1f} MB -> {bytes_after / mb:.1f} MB "
+        f"(saved {(bytes_before - bytes_after) / mb:.1f} MB, {bytes_after / bytes_before:.1%} of original)"
+    )
+    logging.info(
+        f"Read throughput: legacy {game_count / old_seconds:.0f} games/s ({bytes_before / mb / old_seconds:.1f} MB/s on disk), "
+        f"compressed {game_count / new_seconds:.0f} games/s ({bytes_after / mb / new_seconds:.1f} MB/s on disk)"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Manage saved Chess.com archive files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="compress legacy .json archives")
+    migrate_parser.add_argument("data_dirs", nargs="+", help="player directories to migrate")
+    migrate_parser.add_argument("--keep", action="store_true", help="keep the original .json files")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.data_dirs, keep=args.keep)
@@ -0,0 +1,155 @@
+import io
+import logging
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from db import create_temporary_table, empty_tables, is_sqlite
+from games import batched
+
+# Rows buffered per COPY statement; bounds memory however many rows are streamed through
+COPY_CHUNK_SIZE = 10000
+
+
+def copy_value(value):
+    """Formats one value for COPY's text format (\\N for NULL, with separators escaped)."""
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_buffer(rows, columns):
+    """Renders rows (dicts) as a tab-separated COPY payload."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(row.get(column)) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def ensure_table(connection, table, rows):
+    """Creates a table outside the managed schema, e.g. a benchmark's, typed from sample rows as DataFrame.to_sql would."""
+    if not inspect(connection).has_table(table):
+        pd.DataFrame(rows).head(0).to_sql(table, connection, index=False)
+        logging.info(f"Created table {table}.")
+
+
+def sqlite_value(value):
+    """Maps the missing-value markers of pandas to NULL, as copy_value does for COPY."""
+    if value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+
+def insert_rows(connection, table, rows, columns):
+    """Inserts rows (dicts) with one executemany; SQLite's stand-in for COPY."""
+    statement = text(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + column for column in columns)})"
+    )
+    connection.execute(statement, [{column: sqlite_value(row.get(column)) for column in columns} for row in rows])
+
+
+def copy_rows(connection, table, rows, columns=None, chunk_size=COPY_CHUNK_SIZE):
+    """Streams rows (dicts) into a table with COPY ... FROM STDIN; returns how many were copied.
+
+    Runs on the caller's SQLAlchemy connection, so it commits or rolls back with the rest of its
+    transaction. The table has to exist (see ensure_table). SQLite has no COPY; there each chunk
+    is one executemany of a prepared INSERT.
+    """
+    copied = 0
+    cursor = None
+    for chunk in batched(rows, chunk_size):
+        if not copied:
+            columns = columns or list(chunk[0])
+        if is_sqlite(connection):
+            insert_rows(connection, table, chunk, columns)
+        else:
+            if cursor is None:
+                cursor = connection.connection.cursor()
+                statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+            cursor.copy_expert(statement, copy_buffer(chunk, columns))
+        copied += len(chunk)
+    if cursor is not None:
+        cursor.close()
+    return copied
+
+
+def merge_rows(connection, table, rows, key, columns=None, chunk_size=COPY_CHUNK_SIZE, inserted_into=None):
+    """Loads rows through a staging table and inserts the ones whose key is new; returns (inserted, skipped).
+
+    `key` is a column name or a sequence of them, matching the table's primary key or a unique index;
+    the table comes from the migrated schema, so nothing is looked up in the catalog per call.
+    With `inserted_into`, an existing table with the same columns, the rows actually inserted are
+    written there as well, in the same statement, so callers can follow up on just the new rows.
+
+    Each chunk is copied into a temporary staging table (never WAL-logged, and private to this
+    connection, so concurrent loaders do not collide), then merged with INSERT ... ON CONFLICT DO
+    NOTHING. Deduplication happens in the database, so memory depends only on the chunk size.
+    SQLite cannot nest the INSERT in a WITH clause, so there the inserted rows come back through
+    RETURNING and are written to `inserted_into` from Python.
+    """
+    key = [key] if isinstance(key, str) else list(key)
+    key_list = ", ".join(key)
+    inserted = skipped = 0
+    staging = f"{table}_staging"
+    merge = None
+    for chunk in batched(rows, chunk_size):
+        if merge is None:
+            columns = columns or list(chunk[0])
+            create_temporary_table(connection, staging, f"SELECT * FROM {table}")
+            column_list = ", ".join(columns)
+            # Sorted so concurrent merges of overlapping games take row locks in the same order
+            merge = (
+                f"INSERT INTO {table} ({column_list}) "
+                f"SELECT {column_list} FROM {staging} WHERE true ORDER BY {key_list} "
+                f"ON CONFLICT ({key_list}) DO NOTHING"
+            )
+            if inserted_into and is_sqlite(connection):
+                merge = f"{merge} RETURNING {column_list}"
+            elif inserted_into:
+                merge = (
+                    f"WITH inserted AS ({merge} RETURNING {column_list}) "
+                    f"INSERT INTO {inserted_into} ({column_list}) SELECT {column_list} FROM inserted"
+                )
+            merge = text(merge)
+        copy_rows(connection, staging, chunk, columns, chunk_size)
+        if inserted_into and is_sqlite(connection):
+            new_rows = connection.execute(merge).mappings().all()
+            if new_rows:
+                insert_rows(connection, inserted_into, new_rows, columns)
+            count = len(new_rows)
+        else:
+            count = connection.execute(merge).rowcount
+        empty_tables(connection, staging)
+        inserted += count
+        skipped += len(chunk) - count
+    return inserted, skipped
+
+
+def update_rows(connection, table, rows, key, columns, chunk_size=COPY_CHUNK_SIZE):
+    """Applies new column values to existing rows with one UPDATE ... FROM join; returns rows changed.
+
+    The values are COPYed into a temporary table typed like the target columns, and only rows
+    whose values are NULL or differ are written, so re-running a backfill touches nothing.
+    """
+    staging = f"{table}_updates"
+    column_list = ", ".join([key, *columns])
+    create_temporary_table(connection, staging, f"SELECT {column_list} FROM {table}")
+    copy_rows(connection, staging, rows, [key, *columns], chunk_size)
+    connection.execute(text(f"ANALYZE {staging}"))
+    assignments = ", ".join(f"{column} = u.{column}" for column in columns)
+    changed = " OR ".join(f"t.{column} IS DISTINCT FROM u.{column}" for column in columns)
+    result = connection.execute(text(
+        f"UPDATE {table} AS t SET {assignments} FROM {staging} AS u WHERE t.{key} = u.{key} AND ({changed})"
+    ))
+    empty_tables(connection, staging)
+    return result.rowcount
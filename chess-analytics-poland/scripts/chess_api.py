@@ -0,0 +1,226 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from archive_store import write_archive_stream
+
+# Chess.com API settings
+HEADERS = {'User-Agent': 'QueenIsBeautiful (your_email@example.com)'}
+# Point this at scripts/replay_server.py to run or benchmark ingestion offline
+API_BASE_URL = os.environ.get("CHESS_API_BASE_URL", "https://api.chess.com/pub").rstrip("/")
+REQUEST_TIMEOUT = 30
+STREAM_CHUNK_SIZE = 64 * 1024
+MAX_RETRIES = 5     # retries for 429 and 5xx responses
+RETRY_BACKOFF = 1.0 # seconds, doubled on every retry unless the server sends Retry-After
+
+# Shared rate limit for every request made through this module
+RATE_LIMIT = float(os.environ.get("CHESS_API_RATE_LIMIT", 4.0))  # requests per second
+RATE_BURST = 4     # requests allowed back-to-back after an idle period
+MAX_WORKERS = int(os.environ.get("CHESS_API_WORKERS", 4))        # concurrent archive downloads
+
+
+class TokenBucket:
+    """Token-bucket rate limiter that can be shared between threads."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and consumes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def size_connection_pool(connections):
+    """Keeps up to `connections` connections to each host alive, one per request that can be in flight.
+
+    Sized for one player's downloads by default; callers running several players at once size it
+    for all of them, or urllib3 discards the extra connections and keep-alive is lost.
+    """
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=connections))
+
+
+# One session and one limiter for the whole process
+session = requests.Session()
+session.headers.update(HEADERS)
+size_connection_pool(MAX_WORKERS)
+rate_limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+
+# Response counters for throughput and rate-limit reporting, over every request of the process
+request_stats = Counter()
+request_stats_lock = threading.Lock()
+
+
+def count(key, stats=None):
+    """Increments one of the shared request counters, and the caller's own `stats` if given."""
+    with request_stats_lock:
+        request_stats[key] += 1
+        if stats is not None:
+            stats[key] += 1
+
+
+def retry_delay(response, attempt):
+    """Returns how long to wait before retrying a throttled or failed request."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+    return RETRY_BACKOFF * 2 ** attempt
+
+
+def get(url, stats=None, **kwargs):
+    """Issues a rate-limited GET through the shared session, retrying 429 and 5xx responses.
+
+    Besides the shared request_stats, the requests are counted in `stats` (a Counter) if given.
+    """
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        response = session.get(url, **kwargs)
+        count("requests", stats)
+        if response.status_code == 429:
+            count("throttled", stats)
+        elif response.status_code >= 500:
+            count("server_errors", stats)
+        else:
+            return response
+        if attempt == MAX_RETRIES:
+            return response
+        response.close()
+        delay = retry_delay(response, attempt)
+        logging.warning(f"{response.status_code} from {url}, retrying in {delay:.1f}s")
+        count("retries", stats)
+        time.sleep(delay)
+
+
+def fetch_all_game_urls(player_name):
+    """Fetches all archive URLs for the given player."""
+    archives_url = f"{API_BASE_URL}/player/{player_name}/games/archives"
+    try:
+        response = get(archives_url)
+        response.raise_for_status()
+        archives = response.json().get("archives", [])
+        logging.info(f"Found {len(archives)} archives for player {player_name}")
+        return archives
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to fetch archives for {player_name}: {e}")
+        return []
+
+
+def fetch_player_list(url):
+    """Fetches a list of usernames from a titled-players or country-players endpoint."""
+    try:
+        response = get(url)
+        response.raise_for_status()
+        return [username.lower() for username in response.json().get("players", [])]
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to fetch players from {url}: {e}")
+        return []
+
+
+def fetch_titled_players(title):
+    """Fetches the usernames of every player holding a title (GM, IM, WGM, ...)."""
+    return fetch_player_list(f"{API_BASE_URL}/titled/{title}")
+
+
+def fetch_country_players(country_code):
+    """Fetches the usernames of every player registered with a country (ISO code, e.g. PL)."""
+    return fetch_player_list(f"{API_BASE_URL}/country/{country_code}/players")
+
+
+def fetch_player_profile(player_name):
+    """Fetches a player's public profile (name, title, country, followers, ...); None if unavailable."""
+    try:
+        response = get(f"{API_BASE_URL}/player/{player_name}")
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to fetch the profile of {player_name}: {e}")
+        return None
+
+
+def stream_archive(archive_url, filename, validators=None, stats=None):
+    """Streams one archive straight to disk without parsing it.
+
+    Returns the path written, None if the archive has not changed since it was cached,
+    or False if the download failed.
+    """
+    headers = validators.conditional_headers(archive_url) if validators is not None else {}
+    try:
+        with get(archive_url, stats, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            path = write_archive_stream(filename, response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error fetching games from {archive_url}: {e}")
+        return False
+    if validators is not None:
+        validators.update(archive_url, response)
+    return path
+
+
+def fetch_concurrently(archive_urls, fetch, max_workers=MAX_WORKERS):
+    """Runs fetch(archive_url, stats) in a thread pool, yielding (archive_url, result) as each one completes.
+
+    A None result counts as not modified. `stats` is a Counter of this call's own requests, so the
+    requests/sec and rate-limit behaviour logged at the end leave out other threads downloading at
+    the same time.
+    """
+    archive_urls = list(archive_urls)
+    if not archive_urls:
+        return
+
+    start = time.perf_counter()
+    stats = Counter()
+    not_modified = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, url, stats): url for url in archive_urls}
+        for future in as_completed(futures):
+            result = future.result()
+            if result is None:
+                not_modified += 1
+            yield futures[future], result
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Requested {len(archive_urls)} archives ({not_modified} not modified) in {elapsed:.1f}s "
+        f"({stats['requests'] / elapsed if elapsed else 0:.2f} requests/sec, {max_workers} workers, "
+        f"{stats['throttled']} throttled, {stats['server_errors']} server errors, {stats['retries']} retries)"
+    )
+
+
+def stream_archives(pending, validators=None, max_workers=MAX_WORKERS):
+    """Streams archives to disk concurrently, yielding (archive_url, path) as each one completes.
+
+    `pending` maps archive URLs to local filenames, as returned by archive_cache.plan_refresh.
+    The path is None for archives that were not modified and False for failed downloads.
+    """
+    return fetch_concurrently(pending, lambda url, stats: stream_archive(url, pending[url], validators, stats), max_workers)
+
+
+def archive_month(archive_url):
+    """Returns the (year, month) strings of an archive URL."""
+    parts = archive_url.rstrip('/').split('/')
+    return parts[-2], parts[-1]
@@ -1,48 +1,33 @@
-import requests
-import json
 import os
-import time
+import sys
+
+from archive_cache import load_validators, plan_refresh
+from chess_api import fetch_all_game_urls, stream_archives
 
 # Constants
-HEADERS = {'User-Agent': 'QueenIsBeautiful (your_email@example.com)'}
-PLAYER_NAME = 'hikaru'
-ARCHIVES_URL = f'https://api.chess.com/pub/player/{PLAYER_NAME}/games/archives'
-DATA_DIR = PLAYER_NAME  
+PLAYER_NAME = sys.argv[1].lower() if len(sys.argv) > 1 else 'hikaru'
+DATA_DIR = PLAYER_NAME
 
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
 
-response = requests.get(ARCHIVES_URL, headers=HEADERS)
-
-if response.status_code == 200:
-    archive_urls = response.json().get('archives', [])
-
-    for archive_url in archive_urls:
-        parts = archive_url.rstrip('/').split('/')
-        year_month = f"{parts[-2]}_{parts[-1]}"
-        filename = os.path.join(DATA_DIR, f"{PLAYER_NAME}_games_{year_month}.json")
+archive_urls = fetch_all_game_urls(PLAYER_NAME)
 
-        # Skip downloading if the file already exists
-        if os.path.exists(filename):
-            print(f"Skipping {filename} (already downloaded)")
-            continue
-
-        # Fetch game data
-        game_response = requests.get(archive_url, headers=HEADERS)
-        
-        if game_response.status_code == 200:
-            game_data = game_response.json()
-            
-            # Save data
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(game_data, f, indent=4)
+if archive_urls:
+    # Skip archives that are already downloaded and complete; revalidate the rest
+    validators = load_validators(DATA_DIR)
+    pending = plan_refresh(archive_urls, DATA_DIR, PLAYER_NAME, validators)
 
+    # Stream archives straight to disk; the shared token bucket in chess_api respects Chess.com API rate limits
+    for archive_url, filename in stream_archives(pending, validators):
+        if filename is None:
+            print(f"Skipping {pending[archive_url]} (not modified)")
+        elif not filename:
+            print(f"Error downloading {archive_url}")
+        else:
             print(f"Downloaded {filename}")
 
-            # Respect Chess.com API rate limits
-            time.sleep(1.2)  # Prevent hitting request limits
-        else:
-            print(f"Error downloading {archive_url}: {game_response.status_code}")
+    validators.save()
 else:
-    print(f"Error fetching archives: {response.status_code}")
+    print("Error fetching archives")
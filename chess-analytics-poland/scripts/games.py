@@ -0,0 +1,142 @@
+import datetime
+import itertools
+import json
+import logging
+import re
+
+# One [Tag "value"] header per line; values may hold backslash-escaped quotes. Only the header
+# block, up to the blank line before the move text, is ever scanned.
+HEADER_PATTERN = re.compile(r'^\[(\w+)[ \t]+"([^"\\\n]*(?:\\.[^"\\\n]*)*)"\][ \t\r]*$', re.MULTILINE)
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+DEFAULT_DATE = '1900-01-01'
+
+# White's and black's score for each PGN result
+SCORES = {"1-0": (1.0, 0.0), "0-1": (0.0, 1.0), "1/2-1/2": (0.5, 0.5)}
+
+
+def parse_pgn_headers(pgn):
+    """Returns every [Tag "value"] header of a PGN as a dict, in one pass that stops at the move text."""
+    end = pgn.find("\n\n")
+    if end < 0:
+        end = len(pgn)
+    headers = dict(HEADER_PATTERN.findall(pgn, 0, end))
+    if pgn.find("\\", 0, end) >= 0:
+        headers = {tag: ESCAPE_PATTERN.sub(r'\1', value) for tag, value in headers.items()}
+    return headers
+
+
+def parse_pgn_headers_batch(pgns):
+    """Parses the headers of many PGNs (a list or a Series); missing PGNs give an empty dict."""
+    return [parse_pgn_headers(pgn) if isinstance(pgn, str) else {} for pgn in pgns]
+
+
+def header_columns(headers, tags):
+    """Turns parsed headers into {tag: [value per game]}, ready to become DataFrame columns."""
+    return {tag: [h.get(tag) for h in headers] for tag in tags}
+
+
+def pgn_date(headers):
+    """Returns the Date header (YYYY-MM-DD) of parsed headers, tolerating case and varying digit counts."""
+    date_str = headers.get('Date')
+    if date_str is None:
+        date_str = next((value for tag, value in headers.items() if tag.lower() == 'date'), None)
+    if date_str is None:
+        logging.warning("No Date tag found in PGN.")
+        return DEFAULT_DATE
+    try:
+        # Split by hand: datetime.strptime costs more than parsing all the headers
+        year, month, day = date_str.split('.')
+        if len(year) != 4:
+            raise ValueError("the year needs four digits")
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+    except ValueError as e:
+        logging.warning(f"Invalid date '{date_str}' in PGN: {e}")
+    return DEFAULT_DATE
+
+
+def extract_date_from_pgn(pgn):
+    """Extracts the date (YYYY-MM-DD) from the PGN, handling case and varying digit counts."""
+    return pgn_date(parse_pgn_headers(pgn))
+
+
+def game_id_of(game):
+    """Returns the identifier a game is stored under."""
+    return game.get("uuid", game["url"].split("/")[-1])
+
+
+def build_game_row(game):
+    """Derives every stored field of a game from its archive entry; returns None for games without PGN."""
+    if "pgn" not in game:
+        return None  # Skip games without PGN
+
+    white = game["white"]
+    black = game["black"]
+    winner = white["username"] if white["result"] == "win" else black["username"]
+    headers = parse_pgn_headers(game["pgn"])
+
+    return {
+        "game_id": game_id_of(game),
+        "white_player_id": white["username"],
+        "black_player_id": black["username"],
+        "white_rating": white.get("rating", 0),
+        "black_rating": black.get("rating", 0),
+        "time_class": game["time_class"],
+        "time_control": game["time_control"],
+        "rules": game["rules"],
+        "pgn": game["pgn"],
+        "start_time": datetime.datetime.fromtimestamp(game["end_time"]).strftime('%Y-%m-%d %H:%M:%S') if game.get("end_time") else None,
+        "winner": winner,
+        "date_time": pgn_date(headers),
+        # Parsed once here for everything downstream (scores, Parquet columns); not a stored column
+        "headers": headers,
+        # The compact move encoding, decoded into the Parquet move arrays; not a stored column
+        "tcn": game.get("tcn"),
+        # Everything else the archive has on the game, for game_raw; the PGN is in game_pgn already
+        "raw": json.dumps({key: value for key, value in game.items() if key != "pgn"}, separators=(",", ":")),
+    }
+
+
+def game_scores(row):
+    """Returns (white score, black score) of a game row, from its PGN result when it has one."""
+    headers = row.get("headers")
+    if headers is None:
+        headers = parse_pgn_headers(row.get("pgn") or "")
+    if headers.get("Result") in SCORES:
+        return SCORES[headers["Result"]]
+    return (1.0, 0.0) if row["winner"] == row["white_player_id"] else (0.0, 1.0)
+
+
+def build_player_game_rows(row):
+    """Returns the game as seen by each of its players: one row for white, one for black."""
+    white_score, black_score = game_scores(row)
+    common = {"game_id": row["game_id"], "date_time": row["date_time"], "time_class": row["time_class"],
+              "opening_id": row.get("opening_id")}
+    return [
+        dict(common, player_id=row["white_player_id"], color="white", rating=row["white_rating"],
+             opponent_id=row["black_player_id"], opponent_rating=row["black_rating"], score=white_score),
+        dict(common, player_id=row["black_player_id"], color="black", rating=row["black_rating"],
+             opponent_id=row["white_player_id"], opponent_rating=row["white_rating"], score=black_score),
+    ]
+
+
+def build_game_rows(games):
+    """Yields a row for every well-formed game of an archive; games already stored are skipped by the database."""
+    for game in games:
+        try:
+            row = build_game_row(game)
+        except KeyError as e:
+            logging.warning(f"Skipping game due to missing key: {e}")
+            continue
+        if row is None:
+            continue  # Skip games without PGN
+        yield row
+
+
+def batched(iterable, size):
+    """Yields lists of up to `size` items, so rows can be streamed through in bounded chunks."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
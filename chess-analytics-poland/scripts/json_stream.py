@@ -0,0 +1,97 @@
+import codecs
+import json
+
+READ_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+
+class JsonStream:
+    """Incremental reader over a binary stream that decodes one JSON value at a time."""
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Reads the next chunk into the buffer, dropping what has been consumed; False at end of stream."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.read_size)
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        if not chunk:
+            self.eof = True
+            self.buffer += self.text_decoder.decode(b"", final=True)
+            return False
+        self.buffer += self.text_decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it ('' at end of stream)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        """Consumes the next non-whitespace character, which must be `char`."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decodes and consumes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value ending exactly at the buffer edge (e.g. a number) may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_array(stream, key=None):
+    """Yields the items of a JSON array one at a time from a binary stream.
+
+    With `key`, the array is taken from that key of a top-level object; a top-level
+    array is accepted as well. Other keys of the object are decoded and skipped.
+    """
+    reader = JsonStream(stream)
+    if reader.peek() == "{":
+        reader.expect("{")
+        while reader.peek() != "}":
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                break
+            reader.value()  # skip the value of any other key
+            if reader.peek() == ",":
+                reader.expect(",")
+        else:
+            return  # the key is missing: no items
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == ",":
+            reader.expect(",")
+        else:
+            reader.expect("]")
+            return
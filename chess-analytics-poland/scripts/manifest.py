@@ -0,0 +1,61 @@
+from sqlalchemy import text
+
+# Archive states, in order: saved to disk, parsed (Parquet written), loaded into games
+FETCHED = "fetched"
+PARSED = "parsed"
+LOADED = "loaded"
+
+CREATE_MANIFEST = text("""
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        archive_url TEXT PRIMARY KEY,
+        player TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        status TEXT NOT NULL,
+        game_count INTEGER,
+        content_hash TEXT,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+""")
+
+SELECT_MANIFEST = text("""
+    SELECT archive_url, filename, status, game_count, content_hash
+    FROM ingest_manifest
+    WHERE player = :player
+""")
+
+UPSERT_MANIFEST = text("""
+    INSERT INTO ingest_manifest (archive_url, player, filename, status, game_count, content_hash, updated_at)
+    VALUES (:archive_url, :player, :filename, :status, :game_count, :content_hash, CURRENT_TIMESTAMP)
+    ON CONFLICT (archive_url) DO UPDATE SET
+        player = EXCLUDED.player,
+        filename = EXCLUDED.filename,
+        status = EXCLUDED.status,
+        game_count = COALESCE(EXCLUDED.game_count, ingest_manifest.game_count),
+        content_hash = COALESCE(EXCLUDED.content_hash, ingest_manifest.content_hash),
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+def ensure_manifest(engine):
+    """Creates the ingest manifest table if it does not exist yet."""
+    with engine.begin() as connection:
+        connection.execute(CREATE_MANIFEST)
+
+
+def load_manifest(engine, player_name):
+    """Returns {archive_url: entry} for every archive of a player recorded in the manifest."""
+    with engine.connect() as connection:
+        rows = connection.execute(SELECT_MANIFEST, {"player": player_name}).mappings().all()
+    return {row["archive_url"]: dict(row) for row in rows}
+
+
+def mark(connection, archive_url, player_name, filename, status, game_count=None, content_hash=None):
+    """Records an archive's state; call inside the transaction that did the work."""
+    connection.execute(UPSERT_MANIFEST, {
+        "archive_url": archive_url,
+        "player": player_name,
+        "filename": filename,
+        "status": status,
+        "game_count": game_count,
+        "content_hash": content_hash,
+    })
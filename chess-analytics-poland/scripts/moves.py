@@ -0,0 +1,166 @@
+import argparse
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# A move in SAN with its optional {[%clk H:MM:SS.s]} comment. Other comments and variations are
+# matched too, only so that nothing inside them is taken for a move; they yield an empty SAN.
+MOVE_PATTERN = re.compile(
+    r'([A-Za-z][^\s{}()]*)(?:\s*\{[^}]*?\[%clk (\d+):(\d\d):(\d\d)(?:\.(\d))?\][^}]*\})?'
+    r'|\{[^}]*\}|\([^)]*\)|;[^\n]*'
+)
+
+# Stands in for the clock of a move that has no %clk annotation
+NO_CLOCK = -1
+
+# Distinct clock readings remembered; a few thousand cover every blitz and rapid game
+CLOCK_CACHE_SIZE = 100000
+
+# chess.com's TCN move encoding: two characters per move. The first 64 characters are the squares
+# a1, b1, ... h8; the rest mark promotions (piece and direction) in the target character and
+# dropped pieces (variants) in the source one.
+TCN_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!?{~}(^)[_]@#$,./&-*++="
+TCN_PIECES = "qnrbkp"
+TCN_CODES = np.full(256, -1, dtype=np.int16)
+for code, char in reversed(list(enumerate(TCN_CHARS))):
+    TCN_CODES[ord(char)] = code
+
+# Source square of a dropped piece; its piece is in the promotion array
+DROP_SQUARE = -1
+
+# Games per worker task when a batch is parsed in a process pool
+PARSE_CHUNK_SIZE = 2000
+
+
+class ClockCache(dict):
+    """Deciseconds for each "H:MM:SS.s]}" clock token, converted once and then looked up."""
+
+    def __missing__(self, token):
+        hours, minutes, seconds = token.rstrip("]}").split(":")
+        seconds, _, tenths = seconds.partition(".")
+        value = ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 10 + int(tenths or 0)
+        if len(self) < CLOCK_CACHE_SIZE:
+            self[token] = value
+        return value
+
+
+clock_cache = ClockCache()
+
+
+def parse_movetext(pgn):
+    """Returns a PGN's moves as (SAN list, clock list), the clocks in deciseconds left after each move.
+
+    Move numbers and the result are skipped; a move without a clock annotation gets NO_CLOCK,
+    so both lists always have one entry per move.
+    """
+    start = pgn.find("\n\n")
+    start = start + 2 if start >= 0 else 0
+    # chess.com writes every move as `N. SAN {[%clk H:MM:SS.s]}`, then the result: when the
+    # tokens have exactly that shape, the moves and clocks are every fourth token
+    tokens = pgn[start:].split()
+    moves = len(tokens) // 4
+    if len(tokens) == 4 * moves + 1 and tokens[2::4].count("{[%clk") == moves:
+        try:
+            return tokens[1::4], list(map(clock_cache.__getitem__, tokens[3::4]))
+        except ValueError:
+            pass
+
+    san, clocks = [], []
+    for move, hours, minutes, seconds, tenths in MOVE_PATTERN.findall(pgn, start):
+        if not move:
+            continue
+        san.append(move)
+        if hours:
+            clocks.append(((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 10 + int(tenths or 0))
+        else:
+            clocks.append(NO_CLOCK)
+    return san, clocks
+
+
+def parse_movetext_batch(pgns, workers=None):
+    """Parses the move text of many PGNs; missing PGNs give empty lists.
+
+    With workers set (0 meaning one per core), the games are split into chunks and parsed in a
+    process pool; otherwise in this process, as the Parquet writers in worker processes do. The
+    pool sends every move back pickled, so it only pays off with several cores to spread over.
+    """
+    pgns = list(pgns)
+    if workers is None:
+        return [parse_movetext(pgn) if isinstance(pgn, str) else ([], []) for pgn in pgns]
+    chunks = [pgns[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(pgns), PARSE_CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers or None) as executor:
+        return [moves for chunk in executor.map(parse_movetext_batch, chunks) for moves in chunk]
+
+
+def decode_tcn_batch(tcns):
+    """Decodes the TCN move strings of many games at once, without a Python loop over moves.
+
+    Returns (offsets, from squares, to squares, promotions) as numpy arrays: the moves of game i
+    are [offsets[i], offsets[i + 1]). Squares count 0 (a1) to 63 (h8); a promotion is
+    1 + its index in TCN_PIECES, or 0. A drop has DROP_SQUARE as its source and the dropped
+    piece as its promotion. Missing TCNs give games without moves.
+    """
+    tcns = [tcn[:len(tcn) & ~1] if isinstance(tcn, str) else "" for tcn in tcns]
+    offsets = np.zeros(len(tcns) + 1, dtype=np.int32)
+    np.cumsum([len(tcn) // 2 for tcn in tcns], out=offsets[1:])
+    codes = TCN_CODES[np.frombuffer("".join(tcns).encode("ascii", "replace"), dtype=np.uint8)].reshape(-1, 2)
+    source, target = codes[:, 0], codes[:, 1]
+
+    promoted = target > 63
+    dropped = source > 75
+    # A promotion's target holds the piece and the file step (-1, 0, +1) from the source square
+    target = np.where(promoted, source + np.where(source < 16, -8, 8) + (target - 1) % 3 - 1, target)
+    promotion = np.where(promoted, (codes[:, 1] - 64) // 3 + 1, 0)
+    promotion = np.where(dropped, source - 79 + 1, promotion)
+    source = np.where(dropped, DROP_SQUARE, source)
+    return offsets, source.astype(np.int8), target.astype(np.int8), promotion.astype(np.int8)
+
+
+def decode_tcn(tcn):
+    """Decodes one game's TCN into a list of (from square, to square, promotion) moves."""
+    _, source, target, promotion = decode_tcn_batch([tcn])
+    return list(zip(source.tolist(), target.tolist(), promotion.tolist()))
+
+
+def square_name(square):
+    """Returns the algebraic name of a square index, e.g. 28 -> 'e4'."""
+    return f"{'abcdefgh'[square % 8]}{square // 8 + 1}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time usage per move, from the clocks in the Parquet cache.")
+    parser.add_argument("data_dir", help="player directory")
+    parser.add_argument("--moves", type=int, default=40, help="move numbers to report (default: 40)")
+    parser.add_argument("--time-class", help="only games of this time class, e.g. blitz")
+    args = parser.parse_args()
+
+    # Imported here so the parser itself does not need pyarrow
+    import pyarrow.compute as pc
+    from parquet_cache import load_player_table
+
+    start = time.perf_counter()
+    table = load_player_table(args.data_dir, ["time_class", "time_control", "clocks"])
+    if args.time_class:
+        table = table.filter(pc.equal(table.column("time_class"), args.time_class))
+    clocks = table.column("clocks").combine_chunks()
+    values = pc.list_flatten(clocks).to_numpy(zero_copy_only=False)
+    offsets = clocks.offsets.to_numpy()
+    lengths = np.diff(offsets)
+    # Ply index of every clock within its game, and the game's increment in deciseconds
+    ply = np.arange(len(values)) - np.repeat(offsets[:-1], lengths)
+    increments = [int(tc.partition("+")[2] or 0) * 10 if tc else 0 for tc in table.column("time_control").to_pylist()]
+    increment = np.repeat(increments, lengths)
+    # Time a move took: the same player's clock two plies earlier, minus this one, plus the increment
+    previous = np.full(len(values), NO_CLOCK)
+    previous[2:] = values[:-2]
+    valid = (ply >= 2) & (values != NO_CLOCK) & (previous != NO_CLOCK)
+    spent = (previous - values + increment)[valid] / 10
+    move_number = ply[valid] // 2 + 1
+    print(f"{len(table)} games, {len(values)} clocks read in {time.perf_counter() - start:.3f}s")
+    print(f"{'move':>4} {'avg s':>7} {'moves':>8}")
+    for number in range(2, args.moves + 1):
+        selected = spent[move_number == number]
+        if len(selected):
+            print(f"{number:>4} {selected.mean():>7.1f} {len(selected):>8}")
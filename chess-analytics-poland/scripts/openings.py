@@ -0,0 +1,134 @@
+import argparse
+import threading
+from urllib.parse import unquote
+
+from sqlalchemy import bindparam, text
+
+from db import is_sqlite
+from games import parse_pgn_headers
+
+# Words that end an opening's family name in chess.com's ECOUrl slugs, e.g. Sicilian-Defense,
+# Italian-Game; whatever follows names the variation
+FAMILY_ENDINGS = {"Opening", "Game", "Defense", "Gambit", "Attack", "System", "Countergambit"}
+# Kept with the family: Queens-Gambit-Declined is an opening of its own, not a variation
+FAMILY_SUFFIXES = {"Accepted", "Declined", "Deferred"}
+
+INSERT_OPENINGS = text("""
+    INSERT INTO openings (eco_url, eco, family, variation)
+    SELECT * FROM UNNEST(CAST(:eco_urls AS TEXT[]), CAST(:ecos AS TEXT[]),
+                         CAST(:families AS TEXT[]), CAST(:variations AS TEXT[]))
+    ON CONFLICT (eco_url) DO NOTHING
+""")
+
+# SQLite has no arrays: one prepared INSERT executed per new opening instead
+INSERT_OPENING = text("""
+    INSERT INTO openings (eco_url, eco, family, variation) VALUES (:eco_url, :eco, :family, :variation)
+    ON CONFLICT (eco_url) DO NOTHING
+""")
+
+SELECT_OPENING_IDS = text(
+    "SELECT eco_url, opening_id FROM openings WHERE eco_url IN :eco_urls"
+).bindparams(bindparam("eco_urls", expanding=True))
+
+
+def opening_names(eco_url):
+    """Splits a chess.com ECOUrl into a normalized (family, variation); variation is None for the main line.
+
+    The move sequence some URLs end with (e.g. ...-Variation-6.Be3) is dropped, so games reaching
+    the same variation by different move orders are counted together.
+    """
+    words = unquote(eco_url.rstrip("/").rsplit("/", 1)[-1]).split("-")
+    for i, word in enumerate(words):
+        if word[:1].isdigit():
+            words = words[:i]
+            break
+    split = len(words)
+    for i, word in enumerate(words):
+        if word in FAMILY_ENDINGS:
+            split = i + 1
+            while split < len(words) and words[split] in FAMILY_SUFFIXES:
+                split += 1
+            break
+    return " ".join(words[:split]), " ".join(words[split:]) or None
+
+
+def game_opening(row):
+    """Returns (ECO code, ECOUrl) of a game row, from its parsed PGN headers."""
+    headers = row.get("headers")
+    if headers is None:
+        headers = parse_pgn_headers(row.get("pgn") or "")
+    return headers.get("ECO"), headers.get("ECOUrl")
+
+
+def add_openings(connection, ecos):
+    """Inserts the openings not stored yet; returns {eco_url: opening_id} for all of them.
+
+    `ecos` maps each ECOUrl to the ECO code its games carry.
+    """
+    rows = []
+    for eco_url, eco in ecos.items():
+        family, variation = opening_names(eco_url)
+        rows.append({"eco_url": eco_url, "eco": eco, "family": family, "variation": variation})
+    if is_sqlite(connection):
+        connection.execute(INSERT_OPENING, rows)
+    else:
+        connection.execute(INSERT_OPENINGS, {
+            "eco_urls": [row["eco_url"] for row in rows],
+            "ecos": [row["eco"] for row in rows],
+            "families": [row["family"] for row in rows],
+            "variations": [row["variation"] for row in rows],
+        })
+    return dict(connection.execute(SELECT_OPENING_IDS, {"eco_urls": list(ecos)}).all())
+
+
+class OpeningCache:
+    """ECOUrl -> opening_id map kept in memory, so the loader resolves openings once per process."""
+
+    def __init__(self):
+        self.ids = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, engine, ecos, connection=None):
+        """Returns {eco_url: opening_id} for `ecos` ({eco_url: eco}), adding unknown openings.
+
+        Works like PlayerCache.resolve: new openings are committed in a short transaction of
+        their own, except on SQLite, where they go through the caller's `connection` uncached.
+        """
+        if connection is not None and is_sqlite(connection):
+            return add_openings(connection, ecos)
+        with self.lock:
+            missing = {eco_url: eco for eco_url, eco in ecos.items() if eco_url not in self.ids}
+            if missing:
+                with engine.begin() as connection:
+                    self.ids.update(add_openings(connection, missing))
+            return {eco_url: self.ids[eco_url] for eco_url in ecos}
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+
+# Shared by every loader thread of the process
+opening_cache = OpeningCache()
+
+
+def with_opening_ids(engine, rows, connection=None):
+    """Returns the game rows with the opening_id of their ECOUrl (None for games without one)."""
+    openings = [game_opening(row) for row in rows]
+    ecos = {eco_url: eco for eco, eco_url in openings if eco_url}
+    ids = opening_cache.resolve(engine, ecos, connection) if ecos else {}
+    return [dict(row, opening_id=ids.get(eco_url)) for row, (_, eco_url) in zip(rows, openings)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Opening repertoire of a player, from the openings index.")
+    parser.add_argument("player", help="chess.com username")
+    parser.add_argument("--by", choices=("variation", "family"), default="variation", help="grouping level")
+    parser.add_argument("--limit", type=int, default=25, help="rows to show")
+    args = parser.parse_args()
+
+    # Imported here so the module itself stays free of a database connection
+    from analyze_data import repertoire
+
+    df = repertoire(args.player, by_family=args.by == "family")
+    print(df.head(args.limit).to_string(index=False))
@@ -0,0 +1,210 @@
+import argparse
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from archive_store import archive_stem, iter_archive_games, list_archives
+from games import batched, build_game_rows, header_columns, parse_pgn_headers_batch
+from moves import decode_tcn_batch, parse_movetext_batch
+
+PARQUET_DIRNAME = "parquet"
+BATCH_SIZE = 5000  # rows per row group
+
+# PGN headers stored as their own columns, named pgn_<tag>
+HEADER_COLUMNS = {
+    "Event": "pgn_event",
+    "Result": "pgn_result",
+    "ECO": "pgn_eco",
+    "ECOUrl": "pgn_eco_url",
+    "UTCDate": "pgn_utc_date",
+    "UTCTime": "pgn_utc_time",
+    "WhiteElo": "pgn_white_elo",
+    "BlackElo": "pgn_black_elo",
+    "TimeControl": "pgn_time_control",
+    "Termination": "pgn_termination",
+    "StartTime": "pgn_start_time",
+    "EndDate": "pgn_end_date",
+    "EndTime": "pgn_end_time",
+    "CurrentPosition": "pgn_current_position",
+    "Link": "pgn_link",
+}
+
+# Per-move arrays decoded from the TCN field
+MOVE_COLUMNS = ["move_from", "move_to", "move_promotion"]
+
+if pa is not None:
+    # The columns converted from a DataFrame of game rows
+    FRAME_SCHEMA = pa.schema(
+        [
+            ("game_id", pa.string()),
+            ("white_player_id", pa.string()),
+            ("black_player_id", pa.string()),
+            ("white_rating", pa.int32()),
+            ("black_rating", pa.int32()),
+            ("time_class", pa.string()),
+            ("time_control", pa.string()),
+            ("rules", pa.string()),
+            ("pgn", pa.string()),
+            ("start_time", pa.timestamp("s")),
+            ("winner", pa.string()),
+            ("date_time", pa.date32()),
+        ]
+        + [(column, pa.string()) for column in HEADER_COLUMNS.values()]
+        + [
+            # The move text, parsed: SAN moves and the clock after each move in deciseconds,
+            # so time usage is read straight from packed int32 arrays
+            ("san", pa.list_(pa.string())),
+            ("clocks", pa.list_(pa.int32())),
+        ]
+    )
+    # Fixed schema so every month file, and the dataset over all of them, has the same columns.
+    # The moves decoded from the TCN (square indexes and promotions, see moves.decode_tcn_batch)
+    # are built straight from numpy arrays rather than through pandas, so they come last.
+    SCHEMA = pa.schema(list(FRAME_SCHEMA) + [(column, pa.list_(pa.int8())) for column in MOVE_COLUMNS])
+
+# Columns derived from the PGN and TCN rather than taken from the game rows
+DERIVED_COLUMNS = [*HEADER_COLUMNS.values(), "san", "clocks", *MOVE_COLUMNS]
+
+
+def parquet_dir(data_dir):
+    """Returns the directory holding a player's Parquet month files."""
+    return os.path.join(data_dir, PARQUET_DIRNAME)
+
+
+def month_path(data_dir, archive_filename):
+    """Returns the Parquet file that caches the same player-month as an archive file."""
+    name = os.path.basename(archive_stem(archive_filename))
+    return os.path.join(parquet_dir(data_dir), f"{name}.parquet")
+
+
+def rows_to_table(rows):
+    """Converts game rows, plus their parsed PGN headers and moves, into an Arrow table."""
+    df = pd.DataFrame(rows, columns=[name for name in SCHEMA.names if name not in DERIVED_COLUMNS])
+    # Rows from build_game_row carry their parsed headers; others are parsed here in one batch
+    headers = [row.get("headers") for row in rows]
+    if None in headers:
+        headers = parse_pgn_headers_batch(df["pgn"])
+    for tag, values in header_columns(headers, HEADER_COLUMNS).items():
+        df[HEADER_COLUMNS[tag]] = values
+    df["san"], df["clocks"] = zip(*parse_movetext_batch(df["pgn"])) if len(df) else ([], [])
+    df["start_time"] = pd.to_datetime(df["start_time"])
+    df["date_time"] = pd.to_datetime(df["date_time"]).dt.date
+    table = pa.Table.from_pandas(df, schema=FRAME_SCHEMA, preserve_index=False)
+    offsets, *moves = decode_tcn_batch([row.get("tcn") for row in rows])
+    offsets = pa.array(offsets)
+    for column, values in zip(MOVE_COLUMNS, moves):
+        table = table.append_column(column, pa.ListArray.from_arrays(offsets, pa.array(values)))
+    return table
+
+
+class MonthWriter:
+    """Writes one player-month Parquet file batch by batch, replacing the old file on close."""
+
+    def __init__(self, data_dir, archive_filename):
+        self.path = month_path(data_dir, archive_filename)
+        self.tmp_path = f"{self.path}.tmp"
+        self.writer = None
+
+    def write(self, rows):
+        """Appends a batch of game rows as a row group; a no-op without pyarrow."""
+        if pa is None or not rows:
+            return
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.writer = pq.ParquetWriter(self.tmp_path, SCHEMA, compression="zstd")
+        self.writer.write_table(rows_to_table(rows))
+
+    def close(self):
+        """Finishes the file and moves it into place; returns its path, or None if nothing was written."""
+        if self.writer is None:
+            return None
+        self.writer.close()
+        self.writer = None
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.writer is not None:
+            self.writer.close()
+            os.remove(self.tmp_path)
+
+
+def load_player_table(data_dir, columns=None):
+    """Loads a player's full cached history as an Arrow table, reading only the requested columns.
+
+    Months cached before a column was added read it as nulls; 'build --force' fills them in.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read the Parquet cache")
+    files = sorted(glob.glob(os.path.join(parquet_dir(data_dir), "*.parquet")))
+    if not files:
+        return SCHEMA.empty_table().select(columns or SCHEMA.names)
+    dataset = ds.dataset(files, schema=SCHEMA, format="parquet")
+    return dataset.to_table(columns=columns)
+
+
+def load_player(data_dir, columns=None):
+    """Loads a player's full cached history, reading only the requested columns."""
+    return load_player_table(data_dir, columns).to_pandas()
+
+
+def build_month(data_dir, archive_filename):
+    """Caches one saved archive as Parquet (runs in a worker process)."""
+    count = 0
+    with MonthWriter(data_dir, archive_filename) as writer:
+        for batch in batched(build_game_rows(iter_archive_games(archive_filename)), BATCH_SIZE):
+            writer.write(batch)
+            count += len(batch)
+    return count
+
+
+def build(data_dirs, workers=None, force=False):
+    """Writes Parquet files for saved archives that are not cached yet (or all of them with force)."""
+    tasks = [
+        (data_dir, archive_filename)
+        for data_dir in data_dirs
+        for archive_filename in list_archives(data_dir)
+        if force or not os.path.exists(month_path(data_dir, archive_filename))
+    ]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        games = sum(executor.map(build_month, *zip(*tasks))) if tasks else 0
+    logging.info(f"Cached {len(tasks)} player-months ({games} games) as Parquet in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Columnar Parquet cache of parsed games per player-month.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="cache saved archives as Parquet")
+    build_parser.add_argument("data_dirs", nargs="+", help="player directories")
+    build_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    build_parser.add_argument("--force", action="store_true", help="rewrite months that are already cached")
+    load_parser = subparsers.add_parser("load", help="time loading a player's history")
+    load_parser.add_argument("data_dir", help="player directory")
+    load_parser.add_argument("--columns", nargs="*", default=None, help="columns to read (default: all)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.data_dirs, args.workers, args.force)
+    elif args.command == "load":
+        start = time.perf_counter()
+        df = load_player(args.data_dir, args.columns)
+        logging.info(f"Loaded {len(df)} games x {len(df.columns)} columns in {time.perf_counter() - start:.3f}s.")
+        print(df.head())
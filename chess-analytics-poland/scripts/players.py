@@ -0,0 +1,180 @@
+import argparse
+import datetime
+import logging
+import threading
+
+from sqlalchemy import bindparam, text
+
+from bulk_load import update_rows
+from chess_api import fetch_player_profile
+from db import is_sqlite
+
+# Profile fields stored in players, filled by refresh_profiles
+PROFILE_COLUMNS = ["name", "title", "country", "followers", "status", "joined", "last_online", "profile_updated_at"]
+
+INSERT_PLAYERS = text("""
+    INSERT INTO players (username, display_name)
+    SELECT * FROM UNNEST(CAST(:usernames AS TEXT[]), CAST(:display_names AS TEXT[]))
+    ON CONFLICT (username) DO NOTHING
+""")
+
+# SQLite has no arrays: one prepared INSERT executed per new player instead
+INSERT_PLAYER = text("""
+    INSERT INTO players (username, display_name) VALUES (:username, :display_name)
+    ON CONFLICT (username) DO NOTHING
+""")
+
+SELECT_PLAYER_IDS = text(
+    "SELECT username, player_id FROM players WHERE username IN :usernames"
+).bindparams(bindparam("usernames", expanding=True))
+
+
+def add_players(connection, names, usernames):
+    """Inserts the players not stored yet among `usernames`; returns {username: player_id} for all of them.
+
+    `names` maps each lowercase username to the spelling kept as its display name.
+    """
+    if is_sqlite(connection):
+        connection.execute(INSERT_PLAYER, [
+            {"username": username, "display_name": names[username]} for username in usernames
+        ])
+    else:
+        connection.execute(INSERT_PLAYERS, {
+            "usernames": usernames,
+            "display_names": [names[username] for username in usernames],
+        })
+    return dict(connection.execute(SELECT_PLAYER_IDS, {"usernames": usernames}).all())
+
+
+class PlayerCache:
+    """Username -> player_id map kept in memory, so the loader resolves players once per process."""
+
+    def __init__(self):
+        self.ids = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, engine, usernames, connection=None):
+        """Returns {lowercase username: player_id}, adding unknown players to the players table.
+
+        New players are committed in a short transaction of their own, so an ID is only cached
+        once it exists for every connection; one round trip covers all new names of a batch.
+        SQLite has a single writer, so while `connection` (the caller's transaction) holds it,
+        players are added and looked up through that connection instead, without caching.
+        """
+        names = {}
+        for username in usernames:
+            if username is not None:
+                names.setdefault(username.lower(), username)
+        if connection is not None and is_sqlite(connection):
+            return add_players(connection, names, list(names))
+        with self.lock:
+            missing = [username for username in names if username not in self.ids]
+            if missing:
+                with engine.begin() as connection:
+                    self.ids.update(add_players(connection, names, missing))
+            return {username: self.ids[username] for username in names}
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+
+# Shared by every loader thread of the process
+player_cache = PlayerCache()
+
+
+def to_fact_rows(engine, rows, connection=None):
+    """Replaces the usernames of game rows with player IDs, as stored in the games table.
+
+    `connection` is the caller's load transaction, which SQLite needs (see PlayerCache.resolve).
+    """
+    ids = player_cache.resolve(
+        engine,
+        [row[column] for row in rows for column in ("white_player_id", "black_player_id", "winner")],
+        connection,
+    )
+    return [
+        dict(
+            row,
+            white_player_id=ids[row["white_player_id"].lower()],
+            black_player_id=ids[row["black_player_id"].lower()],
+            winner=ids[row["winner"].lower()] if row["winner"] is not None else None,
+        )
+        for row in rows
+    ]
+
+
+def timestamp(value):
+    """Converts a Unix timestamp from the API, if any, to a datetime."""
+    return datetime.datetime.fromtimestamp(value) if value else None
+
+
+def profile_row(username, profile):
+    """Maps a Chess.com profile to the players columns."""
+    return {
+        "username": username.lower(),
+        "name": profile.get("name"),
+        "title": profile.get("title"),
+        # The API gives the country as a URL ending in its ISO code
+        "country": profile["country"].rstrip("/").split("/")[-1] if profile.get("country") else None,
+        "followers": profile.get("followers"),
+        "status": profile.get("status"),
+        "joined": timestamp(profile.get("joined")),
+        "last_online": timestamp(profile.get("last_online")),
+        "profile_updated_at": datetime.datetime.now().replace(microsecond=0),
+    }
+
+
+def refresh_profiles(engine, usernames):
+    """Fetches the profiles of players and stores their metadata; returns how many were updated."""
+    player_cache.resolve(engine, usernames)  # players not seen in any game yet get a row first
+    rows = []
+    for username in usernames:
+        profile = fetch_player_profile(username.lower())
+        if profile is not None:
+            rows.append(profile_row(username, profile))
+    if not rows:
+        return 0
+    with engine.begin() as connection:
+        updated = update_rows(connection, 'players', rows, 'username', PROFILE_COLUMNS)
+    logging.info(f"Refreshed {len(rows)} player profiles ({updated} changed).")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="The players dimension.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    profiles_parser = subparsers.add_parser("profiles", help="fetch and store profile metadata")
+    profiles_parser.add_argument("usernames", nargs="*", help="players to refresh")
+    profiles_parser.add_argument("--stale-days", type=int, default=None,
+                                 help="instead, refresh every player whose profile is older than this (or missing)")
+    subparsers.add_parser("list", help="show the players with the most games")
+    args = parser.parse_args()
+
+    # Imported here so the module itself stays free of a database connection
+    from db import engine
+    from schema import migrate
+
+    migrate(engine)
+    if args.command == "profiles":
+        usernames = args.usernames
+        if args.stale_days is not None:
+            cutoff = datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(days=args.stale_days)
+            with engine.connect() as connection:
+                usernames = connection.execute(text("""
+                    SELECT username FROM players
+                    WHERE profile_updated_at IS NULL OR profile_updated_at < :cutoff
+                    ORDER BY username
+                """), {"cutoff": cutoff}).scalars().all()
+        refresh_profiles(engine, usernames)
+    elif args.command == "list":
+        with engine.connect() as connection:
+            rows = connection.execute(text("""
+                SELECT p.username, p.title, p.country, s.white_games + s.black_games AS games
+                FROM players p
+                JOIN player_summary s ON s.player_id = p.player_id
+                ORDER BY games DESC
+                LIMIT 20
+            """)).all()
+        for username, title, country, games in rows:
+            print(f"{username:<25} {title or '':<4} {country or '':<3} {games:>8}")
@@ -0,0 +1,115 @@
+import argparse
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from archive_store import iter_archive_games, list_archives
+from connection_to_database import merge_games
+from db import empty_tables, engine
+from games import build_game_rows
+from schema import ensure_partitions, migrate, remember_partitions
+from summaries import apply_new_games
+
+LOAD_BATCH_SIZE = 10000
+# Archives parsed or waiting to be merged, per worker process; parsing outruns the merge, so
+# without a bound the parsed rows of every archive would pile up in this process
+ARCHIVES_IN_FLIGHT_PER_WORKER = 2
+
+
+def find_player_dirs(data_root, players=None):
+    """Returns {player: data_dir} for every player directory holding saved archives."""
+    if players:
+        candidates = players
+    else:
+        candidates = sorted(
+            name for name in os.listdir(data_root) if os.path.isdir(os.path.join(data_root, name))
+        )
+    player_dirs = {}
+    for player in candidates:
+        data_dir = os.path.join(data_root, player)
+        if list_archives(data_dir):
+            player_dirs[player] = data_dir
+        elif players:
+            logging.warning(f"No saved archives for {player} in {data_dir}")
+    return player_dirs
+
+
+def parse_archive_file(archive_filename):
+    """Parses one saved archive into game rows (runs in a worker process)."""
+    return archive_filename, list(build_game_rows(iter_archive_games(archive_filename)))
+
+
+def map_bounded(executor, func, items, window):
+    """Like executor.map, in order, but with at most `window` tasks submitted and not yet consumed."""
+    items = iter(items)
+    pending = deque(executor.submit(func, item) for item in itertools.islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        pending.extend(executor.submit(func, item) for item in itertools.islice(items, 1))
+        yield result
+
+
+def load_rows(rows):
+    """Merges a batch of game rows into the games table; returns (inserted, skipped)."""
+    with engine.begin() as connection:
+        created = ensure_partitions(connection, {row["date_time"] for row in rows})
+    remember_partitions(created)
+    with engine.begin() as connection:
+        inserted, skipped = merge_games(connection, rows)
+        apply_new_games(connection)
+    return inserted, skipped
+
+
+def rebuild(data_root, players=None, workers=None, replace=False):
+    """Rebuilds the games table from saved archives without touching the network."""
+    player_dirs = find_player_dirs(data_root, players)
+    archive_files = [f for data_dir in player_dirs.values() for f in list_archives(data_dir)]
+    if not archive_files:
+        logging.warning(f"No saved archives found under {data_root}.")
+        return
+    logging.info(f"Rebuilding from {len(archive_files)} archives of {len(player_dirs)} players.")
+
+    migrate(engine)
+    if replace:
+        with engine.begin() as connection:
+            empty_tables(connection, "games", "game_pgn", "game_raw", "player_games", "player_summary",
+                         "pairing_summary")
+        logging.info("Emptied the games tables; they will be refilled from the archives.")
+
+    start = time.perf_counter()
+    batch, parsed, loaded, skipped = [], 0, 0, 0
+    window = (workers or os.cpu_count() or 1) * ARCHIVES_IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # One archive file per task, a bounded number ahead of the merge; games shared by
+        # players who met each other, or already stored, are skipped by the merge
+        for archive_filename, rows in map_bounded(executor, parse_archive_file, archive_files, window):
+            parsed += len(rows)
+            batch.extend(rows)
+            if len(batch) >= LOAD_BATCH_SIZE:
+                batch_loaded, batch_skipped = load_rows(batch)
+                loaded += batch_loaded
+                skipped += batch_skipped
+                batch = []
+        if batch:
+            batch_loaded, batch_skipped = load_rows(batch)
+            loaded += batch_loaded
+            skipped += batch_skipped
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Parsed {parsed} games and loaded {loaded} new ones ({skipped} already stored) in {elapsed:.1f}s "
+        f"({parsed / elapsed if elapsed else 0:.0f} games/sec)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the games table from saved archive files, offline.")
+    parser.add_argument("players", nargs="*", help="players to rebuild (default: every player directory found)")
+    parser.add_argument("--data-root", default=os.getcwd(), help="directory holding the {player}/ archive folders")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: one per core)")
+    parser.add_argument("--replace", action="store_true", help="empty the games table first")
+    args = parser.parse_args()
+    rebuild(args.data_root, args.players, args.workers, args.replace)
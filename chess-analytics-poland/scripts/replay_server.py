@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chess_api
+
+UPSTREAM_BASE_URL = "https://api.chess.com/pub"
+PATH_PREFIX = "/pub"
+
+
+class ReplayConfig:
+    """Settings shared by every request handler of one server."""
+
+    def __init__(self, root, record=False, upstream=UPSTREAM_BASE_URL, latency=0.0, jitter=0.0,
+                 rate_429=0.0, rate_5xx=0.0, seed=None):
+        self.root = root
+        self.record = record
+        self.upstream = upstream.rstrip("/")
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def roll(self):
+        with self.lock:
+            return self.random.random(), self.random.uniform(-self.jitter, self.jitter)
+
+
+def recording_path(root, api_path):
+    """Returns the file a response for an API path (e.g. player/hikaru/games/2024/01) is recorded in."""
+    return os.path.join(root, *api_path.strip("/").split("/")) + ".json"
+
+
+def load_recording(root, api_path):
+    """Returns (body, etag) of a recorded response, or None."""
+    path = recording_path(root, api_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        body = f.read()
+    return body, f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def save_recording(root, api_path, body):
+    """Records the body of an upstream response."""
+    path = recording_path(root, api_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(body)
+
+
+def record_from_upstream(config, api_path):
+    """Fetches an API path from the real API through the shared rate-limited client and records it."""
+    response = chess_api.get(f"{config.upstream}/{api_path}")
+    if response.status_code != 200:
+        return None
+    save_recording(config.root, api_path, response.content)
+    config.count("recorded")
+    return load_recording(config.root, api_path)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Serves recorded Chess.com API responses, with optional latency and injected errors."""
+
+    config = None
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def send_body(self, status, body, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.config
+        config.count("requests")
+        chance, jitter = config.roll()
+        if config.latency or jitter:
+            time.sleep(max(config.latency + jitter, 0))
+
+        # Injected faults, checked before the recording so they also hit cached archives
+        if chance < config.rate_429:
+            config.count("429")
+            self.send_body(429, b'{"message":"Too Many Requests"}', [("Retry-After", "1")])
+            return
+        if chance < config.rate_429 + config.rate_5xx:
+            config.count("5xx")
+            self.send_body(503, b'{"message":"Service Unavailable"}')
+            return
+
+        api_path = self.path.split("?", 1)[0]
+        if api_path.startswith(PATH_PREFIX + "/"):
+            api_path = api_path[len(PATH_PREFIX):]
+        api_path = api_path.strip("/")
+
+        recording = load_recording(config.root, api_path)
+        if recording is None and config.record:
+            recording = record_from_upstream(config, api_path)
+        if recording is None:
+            config.count("404")
+            self.send_body(404, b'{"message":"Not recorded"}')
+            return
+
+        body, etag = recording
+        if self.headers.get("If-None-Match") == etag:
+            config.count("304")
+            self.send_body(304, b"", [("ETag", etag)])
+            return
+
+        if api_path.endswith("/games/archives"):
+            # Point archive URLs back at this server
+            local_base = f"http://{self.headers.get('Host')}{PATH_PREFIX}"
+            body = body.replace(config.upstream.encode(), local_base.encode())
+
+        config.count("200")
+        self.send_body(200, body, [("Content-Type", "application/json"), ("ETag", etag)])
+
+
+def serve(config, host, port):
+    """Runs the replay server until interrupted, then prints what it served."""
+    handler = type("ConfiguredReplayHandler", (ReplayHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    logging.info(
+        f"Replaying {config.root} on http://{host}:{port}{PATH_PREFIX} "
+        f"(record={config.record}, latency={config.latency * 1000:.0f}±{config.jitter * 1000:.0f}ms, "
+        f"429={config.rate_429:.0%}, 5xx={config.rate_5xx:.0%}); "
+        f"set CHESS_API_BASE_URL=http://{host}:{port}{PATH_PREFIX} for the fetch scripts"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info(f"Served: {json.dumps(dict(config.stats), sort_keys=True)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for api.chess.com.")
+    parser.add_argument("root", help="directory holding recorded responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--record", action="store_true", help="fetch and record responses missing from root")
+    parser.add_argument("--upstream", default=UPSTREAM_BASE_URL, help="API to record from")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per request, in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- latency, in ms")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the injected faults")
+    args = parser.parse_args()
+
+    serve(
+        ReplayConfig(
+            args.root,
+            record=args.record,
+            upstream=args.upstream,
+            latency=args.latency / 1000,
+            jitter=args.jitter / 1000,
+            rate_429=args.rate_429,
+            rate_5xx=args.rate_5xx,
+            seed=args.seed,
+        ),
+        args.host,
+        args.port,
+    )
@@ -0,0 +1,112 @@
+import argparse
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import chess_api
+import manifest
+from connection_to_database import process_player_games
+from db import engine
+from players import refresh_profiles
+from schema import migrate
+
+# Every title Chess.com exposes through /pub/titled/{title}
+TITLES = ["GM", "WGM", "IM", "WIM", "FM", "WFM", "CM", "WCM", "NM", "WNM"]
+DEFAULT_COUNTRY = "PL"
+PLAYER_WORKERS = 4
+
+
+def read_roster_file(path):
+    """Reads usernames from a file, one per line; blank lines and # comments are ignored."""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line.lower() for line in lines if line]
+
+
+def discover_players(country=DEFAULT_COUNTRY, titles=TITLES):
+    """Returns the titled players registered with a country, from the public titled and country endpoints."""
+    country_players = set(chess_api.fetch_country_players(country))
+    logging.info(f"{len(country_players)} players registered with country {country}")
+    roster = set()
+    for title in titles:
+        titled = set(chess_api.fetch_titled_players(title)) & country_players
+        logging.info(f"{len(titled)} {title}s from {country}")
+        roster |= titled
+    return sorted(roster)
+
+
+def build_roster(players=(), roster_file=None, discover=False, country=DEFAULT_COUNTRY, titles=TITLES):
+    """Merges usernames given directly, read from a file and discovered from the API, without duplicates."""
+    roster = [player.lower() for player in players]
+    if roster_file:
+        roster += read_roster_file(roster_file)
+    if discover:
+        roster += discover_players(country, titles)
+    return list(dict.fromkeys(roster))
+
+
+def ingest_roster(roster, workers=PLAYER_WORKERS):
+    """Ingests every player on the roster across a worker pool sharing one HTTP session and rate limiter.
+
+    Games between two roster players are inserted once: the loader skips game IDs already stored.
+    """
+    if not roster:
+        logging.warning("The roster is empty; nothing to ingest.")
+        return
+
+    # Created once up front so concurrent players do not race to create them
+    migrate(engine)
+    manifest.ensure_manifest(engine)
+    # Every player downloads with a pool of its own, all through the one shared session
+    chess_api.size_connection_pool(workers * chess_api.MAX_WORKERS)
+
+    start = time.perf_counter()
+    stats_before = Counter(chess_api.request_stats)
+    inserted_total = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_player_games, player): player
+            for player in roster
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            player = futures[future]
+            try:
+                inserted = future.result()
+            except Exception as e:
+                failed.append(player)
+                logging.error(f"[{done}/{len(roster)}] {player}: failed: {e}")
+                continue
+            inserted_total += inserted
+            logging.info(f"[{done}/{len(roster)}] {player}: {inserted} new games")
+
+    elapsed = time.perf_counter() - start
+    stats = Counter(chess_api.request_stats)
+    stats.subtract(stats_before)
+    logging.info(
+        f"Roster done: {len(roster) - len(failed)}/{len(roster)} players, {inserted_total} new games "
+        f"in {elapsed:.1f}s ({inserted_total / elapsed if elapsed else 0:.0f} games/sec, "
+        f"{stats['requests']} requests at {stats['requests'] / elapsed if elapsed else 0:.2f} requests/sec, "
+        f"{stats['throttled']} throttled, {stats['retries']} retries)"
+    )
+    if failed:
+        logging.warning(f"Failed players: {', '.join(failed)}")
+
+    # Roster players are the ones reports are about, so keep their profile metadata current
+    refresh_profiles(engine, roster)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the games of a whole roster of players, non-interactively.")
+    parser.add_argument("players", nargs="*", help="usernames to ingest")
+    parser.add_argument("--file", dest="roster_file", help="file with one username per line")
+    parser.add_argument("--discover", action="store_true", help="add every titled player registered with --country")
+    parser.add_argument("--country", default=DEFAULT_COUNTRY, help="ISO country code for --discover (default: PL)")
+    parser.add_argument("--titles", nargs="+", default=TITLES, help="titles for --discover (default: all)")
+    parser.add_argument("--workers", type=int, default=PLAYER_WORKERS, help="players ingested concurrently")
+    args = parser.parse_args()
+
+    roster = build_roster(args.players, args.roster_file, args.discover, args.country, args.titles)
+    logging.info(f"Roster of {len(roster)} players: {', '.join(roster)}")
+    ingest_roster(roster, args.workers)
@@ -0,0 +1,913 @@
+import argparse
+import datetime
+import gzip
+import logging
+import os
+import re
+import threading
+
+from sqlalchemy import text
+
+from bulk_load import update_rows
+from db import is_sqlite
+from games import DEFAULT_DATE, parse_pgn_headers
+from openings import add_openings
+from summaries import add_to_summaries, rebuild_summaries
+
+# Serializes migrations when several loaders start at once (e.g. roster workers)
+MIGRATION_LOCK_ID = 7240101
+# Serializes partition creation between loaders
+PARTITION_LOCK_ID = 7240102
+
+# Tables range-partitioned by month of date_time, one {table}_yYYYYmMM partition per month
+PARTITIONED_TABLES = ("games", "game_pgn", "player_games", "game_raw")
+PARTITION_PATTERN = re.compile(r"^(\w+?)_y(\d{4})m(\d{2})$")
+# Appended to the name of a detached partition, freeing the name for a new partition of its month
+DETACHED_SUFFIX = "_detached"
+
+# A table named in a query's FROM or JOIN clause (subqueries start with a parenthesis instead)
+QUERY_TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)", re.IGNORECASE)
+
+CREATE_SCHEMA_VERSION = text("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+""")
+
+# Column types of the games table; tables created by DataFrame.to_sql are converted to these
+GAMES_COLUMNS = {
+    "game_id": "TEXT",
+    "white_player_id": "TEXT",
+    "black_player_id": "TEXT",
+    "white_rating": "INTEGER",
+    "black_rating": "INTEGER",
+    "time_class": "TEXT",
+    "time_control": "TEXT",
+    "rules": "TEXT",
+    "pgn": "TEXT",
+    "start_time": "TIMESTAMP",
+    "winner": "TEXT",
+    "date_time": "DATE",
+}
+
+# information_schema.columns.data_type for each type above
+DATA_TYPES = {
+    "TEXT": "text",
+    "INTEGER": "integer",
+    "TIMESTAMP": "timestamp without time zone",
+    "DATE": "date",
+}
+
+# The hot fact row: every column but the PGN text, which lives in game_pgn, with
+# players referenced by their integer ID in the players table
+FACT_COLUMNS = [name for name in GAMES_COLUMNS if name != "pgn"]
+PLAYER_COLUMNS = ("white_player_id", "black_player_id", "winner")
+FACT_TYPES = {name: "INTEGER" if name in PLAYER_COLUMNS else GAMES_COLUMNS[name] for name in FACT_COLUMNS}
+PGN_COLUMNS = ["game_id", "date_time", "pgn"]
+# Primary key of games and game_pgn; the partition key has to be part of it
+GAME_KEY = ("game_id", "date_time")
+
+# The archive's game object, minus the PGN that game_pgn holds, as JSON
+RAW_COLUMNS = ["game_id", "date_time", "raw"]
+# Typed columns generated from the raw JSON: {column: (type, JSON path)}. A new field gets an
+# entry here and a migration of its own calling add_raw_field, which fills it for every stored
+# game without a download.
+RAW_FIELDS = {
+    "rated": ("BOOLEAN", ("rated",)),
+    "white_result": ("TEXT", ("white", "result")),
+    "black_result": ("TEXT", ("black", "result")),
+    "white_accuracy": ("REAL", ("accuracies", "white")),
+    "black_accuracy": ("REAL", ("accuracies", "black")),
+    "eco_url": ("TEXT", ("eco",)),
+    "fen": ("TEXT", ("fen",)),
+}
+# The fields game_raw is created with (migration 9); later ones are added by later migrations
+INITIAL_RAW_FIELDS = ("rated", "white_result", "black_result", "white_accuracy", "black_accuracy", "eco_url")
+
+# Each game from each player's side; the key doubles as the (player, date) index
+PLAYER_GAME_COLUMNS = ["player_id", "date_time", "game_id", "color", "rating", "opponent_id",
+                       "opponent_rating", "score", "time_class"]
+PLAYER_GAME_KEY = ("player_id", "date_time", "game_id")
+
+# What the loader writes: the columns above, which the earlier migrations built on, plus the
+# ones later migrations added
+LOADED_FACT_COLUMNS = [*FACT_COLUMNS, "opening_id"]
+LOADED_PLAYER_GAME_COLUMNS = [*PLAYER_GAME_COLUMNS, "opening_id"]
+
+# Rows of game_pgn read at a time when backfilling from the stored PGNs
+BACKFILL_CHUNK_SIZE = 10000
+
+# A player's repertoire is an index-only scan of their (opening, color, score) entries, and the
+# games of an opening one range of games_opening_idx
+OPENING_INDEXES = {
+    "openings_family_idx": "openings (family, variation)",
+    "openings_eco_idx": "openings (eco)",
+    "games_opening_idx": "games (opening_id, date_time)",
+    "player_games_opening_idx": "player_games (player_id, opening_id) INCLUDE (color, score)",
+}
+
+CREATE_PLAYERS = text("""
+    CREATE TABLE IF NOT EXISTS players (
+        player_id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        display_name TEXT,
+        name TEXT,
+        title TEXT,
+        country TEXT,
+        followers INTEGER,
+        status TEXT,
+        joined TIMESTAMP,
+        last_online TIMESTAMP,
+        profile_updated_at TIMESTAMP
+    )
+""")
+
+# Per-player, time-ordered access: the OR filter of the player query becomes a BitmapOr of
+# these two, and each player's games come back already sorted by date
+GAMES_INDEXES = {
+    "games_white_player_date_idx": "games (white_player_id, date_time)",
+    "games_black_player_date_idx": "games (black_player_id, date_time)",
+    # Covers the pairing aggregate, so it can be answered from the index alone
+    "games_pairing_idx": "games (white_player_id, black_player_id) INCLUDE (white_rating, black_rating)",
+}
+
+CREATE_PLAYER_SUMMARY = """
+    CREATE TABLE player_summary (
+        player_id INTEGER PRIMARY KEY REFERENCES players (player_id),
+        white_games INTEGER NOT NULL,
+        black_games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        draws INTEGER NOT NULL,
+        losses INTEGER NOT NULL,
+        rating_sum BIGINT NOT NULL,
+        opponent_rating_sum BIGINT NOT NULL
+    )
+"""
+
+CREATE_PAIRING_SUMMARY = """
+    CREATE TABLE pairing_summary (
+        white_player_id INTEGER NOT NULL REFERENCES players (player_id),
+        black_player_id INTEGER NOT NULL REFERENCES players (player_id),
+        games INTEGER NOT NULL,
+        white_rating_sum BIGINT NOT NULL,
+        black_rating_sum BIGINT NOT NULL,
+        white_wins INTEGER NOT NULL,
+        draws INTEGER NOT NULL,
+        black_wins INTEGER NOT NULL,
+        PRIMARY KEY (white_player_id, black_player_id)
+    )
+"""
+
+# A new SQLite database starts at this version, with the layout the PostgreSQL migrations up
+# to it produce, minus partitioning; later migrations run on both backends
+SQLITE_BASELINE = 8
+
+
+def sqlite_schema():
+    """Returns the CREATE statements of the SQLite baseline schema."""
+    fact_columns = ",\n".join(f"{name} {sql_type}" for name, sql_type in FACT_TYPES.items())
+    player_references = ",\n".join(f"FOREIGN KEY ({name}) REFERENCES players (player_id)" for name in PLAYER_COLUMNS)
+    return [
+        """
+        CREATE TABLE players (
+            player_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            display_name TEXT,
+            name TEXT,
+            title TEXT,
+            country TEXT,
+            followers INTEGER,
+            status TEXT,
+            joined TIMESTAMP,
+            last_online TIMESTAMP,
+            profile_updated_at TIMESTAMP
+        )
+        """,
+        f"CREATE TABLE games (\n{fact_columns},\nPRIMARY KEY ({', '.join(GAME_KEY)}),\n{player_references}\n)",
+        "CREATE INDEX games_white_player_date_idx ON games (white_player_id, date_time)",
+        "CREATE INDEX games_black_player_date_idx ON games (black_player_id, date_time)",
+        # No INCLUDE in SQLite: the ratings become trailing key columns instead
+        "CREATE INDEX games_pairing_idx ON games (white_player_id, black_player_id, white_rating, black_rating)",
+        "CREATE TABLE game_pgn (game_id TEXT NOT NULL, date_time DATE NOT NULL, pgn TEXT, PRIMARY KEY (game_id, date_time))",
+        f"""
+        CREATE TABLE player_games (
+            player_id INTEGER NOT NULL REFERENCES players (player_id),
+            date_time DATE NOT NULL,
+            game_id TEXT NOT NULL,
+            color TEXT NOT NULL,
+            rating INTEGER,
+            opponent_id INTEGER REFERENCES players (player_id),
+            opponent_rating INTEGER,
+            score REAL,
+            time_class TEXT,
+            PRIMARY KEY ({', '.join(PLAYER_GAME_KEY)})
+        )
+        """,
+        CREATE_PLAYER_SUMMARY,
+        CREATE_PAIRING_SUMMARY,
+    ]
+
+
+def raw_field_sql(connection, name, stored=True):
+    """Returns the definition of a column generated from game_raw.raw at a RAW_FIELDS path."""
+    sql_type, path = RAW_FIELDS[name]
+    if is_sqlite(connection):
+        expression = f"json_extract(raw, '$.{'.'.join(path)}')"
+    else:
+        expression = f"(raw #>> '{{{','.join(path)}}}')::{sql_type}"
+    return f"{name} {sql_type} GENERATED ALWAYS AS ({expression}) {'STORED' if stored else 'VIRTUAL'}"
+
+
+def add_raw_field(connection, name):
+    """Adds a RAW_FIELDS entry to game_raw as a generated column, computed for every stored game.
+
+    On PostgreSQL this is one table rewrite; SQLite can only add virtual generated columns,
+    computed when read.
+    """
+    definition = raw_field_sql(connection, name, stored=not is_sqlite(connection))
+    connection.execute(text(f"ALTER TABLE game_raw ADD COLUMN {definition}"))
+
+
+# Partitions this process has seen exist, so loaders skip the catalog lookup
+known_partitions = set()
+known_partitions_lock = threading.Lock()
+
+
+def month_start(value):
+    """Returns the first day of the month of a date, datetime or 'YYYY-MM-DD' string."""
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_month(start):
+    """Returns the first day of the month after `start`."""
+    return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def previous_month(start):
+    """Returns the first day of the month before `start`."""
+    return (start - datetime.timedelta(days=1)).replace(day=1)
+
+
+def partition_name(start, table="games"):
+    """Returns the name of the partition of `table` holding the month starting at `start`."""
+    return f"{table}_y{start.year}m{start.month:02d}"
+
+
+def parse_partition(name):
+    """Returns (parent table, first day of month) of a partition name, or None for any other table."""
+    match = PARTITION_PATTERN.match(name)
+    if not match or match.group(1) not in PARTITIONED_TABLES:
+        return None
+    return match.group(1), datetime.date(int(match.group(2)), int(match.group(3)), 1)
+
+
+def partitioned_tables(connection):
+    """Returns which of the partitioned tables exist (older schemas have fewer)."""
+    found = set(connection.execute(
+        text("SELECT relname FROM pg_class WHERE relkind = 'p' AND relname = ANY(:tables)"),
+        {"tables": list(PARTITIONED_TABLES)},
+    ).scalars())
+    return [table for table in PARTITIONED_TABLES if table in found]
+
+
+def existing_partitions(connection):
+    """Returns the names of the partitions currently attached to the partitioned tables."""
+    rows = connection.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE parent.relname = ANY(:tables)
+    """), {"tables": list(PARTITIONED_TABLES)}).scalars()
+    return set(rows)
+
+
+def ensure_partitions(connection, dates):
+    """Creates the monthly partitions that rows with these dates need, in every partitioned table.
+
+    Creating a partition locks its parent table until the transaction ends, so loaders call this
+    in a short transaction of its own before loading, for the months they expect. Returns the
+    names of the partitions it found or created that were not cached yet; they are only known to
+    exist once the caller's transaction commits, so the caller passes them to
+    remember_partitions then. A no-op on SQLite.
+    """
+    if is_sqlite(connection):
+        return set()  # SQLite tables are not partitioned
+    months = {month_start(value) for value in dates if value is not None}
+    with known_partitions_lock:
+        missing = sorted(
+            month for month in months
+            if any(partition_name(month, table) not in known_partitions for table in PARTITIONED_TABLES)
+        )
+    if not missing:
+        return set()
+    tables = partitioned_tables(connection)
+    needed = {partition_name(month, table) for table in tables for month in missing}
+    existing = existing_partitions(connection)
+    if needed <= existing:
+        return needed
+    # Only taken when a partition really is missing: inside a load transaction the lock is held
+    # until commit, so the catalog is checked without it first
+    connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+    existing = existing_partitions(connection)
+    taken = set(connection.execute(
+        text("SELECT relname FROM pg_class WHERE relname = ANY(:names) AND relnamespace = current_schema()::regnamespace"),
+        {"names": sorted(needed - existing)},
+    ).scalars())
+    for table in tables:
+        for month in missing:
+            name = partition_name(month, table)
+            if name in existing:
+                continue
+            if name in taken:
+                raise RuntimeError(
+                    f"{name} exists but is not a partition of {table}; rename or drop it "
+                    f"before loading games of {month:%Y-%m}"
+                )
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            ))
+            logging.info(f"Created partition {name}.")
+    return needed
+
+
+def remember_partitions(names):
+    """Caches partitions returned by ensure_partitions, once the transaction that made them committed."""
+    with known_partitions_lock:
+        known_partitions.update(names)
+
+
+def column_types(connection, table):
+    """Returns {column: data_type} of a table (empty if it does not exist)."""
+    rows = connection.execute(text("""
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table
+    """), {"table": table}).all()
+    return dict(rows)
+
+
+def create_games(connection):
+    """Creates the games table with proper types, or converts the one DataFrame.to_sql inferred."""
+    existing = column_types(connection, "games")
+    if not existing:
+        columns = ",\n".join(f"{name} {sql_type}" for name, sql_type in GAMES_COLUMNS.items())
+        connection.execute(text(f"CREATE TABLE games (\n{columns}\n)"))
+        return
+    for name, sql_type in GAMES_COLUMNS.items():
+        if name not in existing:
+            connection.execute(text(f"ALTER TABLE games ADD COLUMN {name} {sql_type}"))
+        elif existing[name] != DATA_TYPES[sql_type]:
+            connection.execute(text(f"ALTER TABLE games ALTER COLUMN {name} TYPE {sql_type} USING {name}::{sql_type}"))
+            logging.info(f"Converted games.{name} from {existing[name]} to {sql_type}.")
+
+
+def add_games_primary_key(connection):
+    """Makes game_id the primary key, dropping duplicate rows and the ad-hoc unique index first."""
+    removed = connection.execute(text("""
+        DELETE FROM games a USING games b
+        WHERE a.game_id = b.game_id AND a.ctid > b.ctid
+    """)).rowcount
+    if removed:
+        logging.info(f"Removed {removed} duplicate games.")
+    connection.execute(text("DROP INDEX IF EXISTS games_game_id_key"))
+    connection.execute(text("ALTER TABLE games ADD PRIMARY KEY (game_id)"))
+
+
+def add_games_indexes(connection):
+    """Adds the composite indexes for per-player, time-ordered queries."""
+    for name, definition in GAMES_INDEXES.items():
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+    connection.execute(text("ANALYZE games"))
+
+
+def partition_games(connection):
+    """Rebuilds games as a table range-partitioned by month of date_time, moving the existing rows."""
+    connection.execute(text("ALTER TABLE games RENAME TO games_unpartitioned"))
+    connection.execute(text("ALTER TABLE games_unpartitioned DROP CONSTRAINT IF EXISTS games_pkey"))
+    for name in GAMES_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    # The partition key is part of the primary key, so it cannot be NULL
+    connection.execute(
+        text("UPDATE games_unpartitioned SET date_time = :default WHERE date_time IS NULL"),
+        {"default": DEFAULT_DATE},
+    )
+
+    columns = ",\n".join(f"{name} {sql_type}" for name, sql_type in GAMES_COLUMNS.items())
+    # A game's date comes from its PGN, so (game_id, date_time) is as unique as game_id
+    connection.execute(text(
+        f"CREATE TABLE games (\n{columns},\nPRIMARY KEY (game_id, date_time)\n) PARTITION BY RANGE (date_time)"
+    ))
+    for name, definition in GAMES_INDEXES.items():
+        connection.execute(text(f"CREATE INDEX {name} ON {definition}"))
+
+    months = connection.execute(text("SELECT DISTINCT date_time FROM games_unpartitioned")).scalars()
+    ensure_partitions(connection, list(months))
+    column_list = ", ".join(GAMES_COLUMNS)
+    moved = connection.execute(text(
+        f"INSERT INTO games ({column_list}) SELECT {column_list} FROM games_unpartitioned"
+    )).rowcount
+    connection.execute(text("DROP TABLE games_unpartitioned"))
+    connection.execute(text("ANALYZE games"))
+    logging.info(f"Moved {moved} games into monthly partitions.")
+
+
+def set_games_aside(connection, suffix):
+    """Renames games and its partitions to games{suffix}, freeing the names for a rebuilt table."""
+    partitions = sorted(name for name in existing_partitions(connection) if name.startswith("games_y"))
+    connection.execute(text(f"ALTER TABLE games RENAME TO games{suffix}"))
+    for name in partitions:
+        connection.execute(text(f"ALTER TABLE {name} RENAME TO {name}{suffix}"))
+    connection.execute(text(f"ALTER TABLE games{suffix} DROP CONSTRAINT games_pkey"))
+    for name in GAMES_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    with known_partitions_lock:
+        known_partitions.clear()
+
+
+def create_partitioned_games(connection, column_types):
+    """Creates games, partitioned by month, with its primary key and indexes."""
+    columns = ",\n".join(f"{name} {sql_type}" for name, sql_type in column_types.items())
+    connection.execute(text(
+        f"CREATE TABLE games (\n{columns},\nPRIMARY KEY ({', '.join(GAME_KEY)})\n) PARTITION BY RANGE (date_time)"
+    ))
+    for name, definition in GAMES_INDEXES.items():
+        connection.execute(text(f"CREATE INDEX {name} ON {definition}"))
+
+
+def split_pgn(connection):
+    """Moves the PGN text into game_pgn and rewrites games as a narrow fact table.
+
+    Both are rebuilt rather than altered, so the games partitions no longer carry the dropped
+    column's bytes: the old tables are renamed aside, copied from, and dropped.
+    """
+    set_games_aside(connection, "_wide")
+    fact_columns = [name for name in GAMES_COLUMNS if name != "pgn"]
+    create_partitioned_games(connection, {name: GAMES_COLUMNS[name] for name in fact_columns})
+    connection.execute(text(f"""
+        CREATE TABLE game_pgn (
+            game_id TEXT,
+            date_time DATE,
+            pgn TEXT,
+            PRIMARY KEY ({', '.join(GAME_KEY)})
+        ) PARTITION BY RANGE (date_time)
+    """))
+
+    months = connection.execute(text("SELECT DISTINCT date_time FROM games_wide")).scalars()
+    ensure_partitions(connection, list(months))
+    fact_list = ", ".join(fact_columns)
+    pgn_list = ", ".join(PGN_COLUMNS)
+    moved = connection.execute(text(f"INSERT INTO games ({fact_list}) SELECT {fact_list} FROM games_wide")).rowcount
+    connection.execute(text(f"INSERT INTO game_pgn ({pgn_list}) SELECT {pgn_list} FROM games_wide"))
+    connection.execute(text("DROP TABLE games_wide"))
+    connection.execute(text("ANALYZE games"))
+    connection.execute(text("ANALYZE game_pgn"))
+    logging.info(f"Split the PGN of {moved} games into game_pgn.")
+
+
+def add_players(connection):
+    """Creates the players dimension and rewrites games to reference players by integer ID.
+
+    Usernames are case-normalized; the spelling first seen in games is kept as display_name.
+    """
+    connection.execute(CREATE_PLAYERS)
+    connection.execute(text("""
+        INSERT INTO players (username, display_name)
+        SELECT LOWER(name), MIN(name)
+        FROM (
+            SELECT white_player_id AS name FROM games
+            UNION ALL
+            SELECT black_player_id FROM games
+            UNION ALL
+            SELECT winner FROM games
+        ) names
+        WHERE name IS NOT NULL
+        GROUP BY LOWER(name)
+        ON CONFLICT (username) DO NOTHING
+    """))
+
+    set_games_aside(connection, "_named")
+    create_partitioned_games(connection, FACT_TYPES)
+    months = connection.execute(text("SELECT DISTINCT date_time FROM games_named")).scalars()
+    ensure_partitions(connection, list(months))
+    player_ids = {"white_player_id": "w.player_id", "black_player_id": "b.player_id", "winner": "x.player_id"}
+    select_list = ", ".join(player_ids.get(name, f"g.{name}") for name in FACT_COLUMNS)
+    moved = connection.execute(text(f"""
+        INSERT INTO games ({', '.join(FACT_COLUMNS)})
+        SELECT {select_list}
+        FROM games_named g
+        JOIN players w ON w.username = LOWER(g.white_player_id)
+        JOIN players b ON b.username = LOWER(g.black_player_id)
+        LEFT JOIN players x ON x.username = LOWER(g.winner)
+    """)).rowcount
+    connection.execute(text("DROP TABLE games_named"))
+    add_player_foreign_keys(connection)
+    connection.execute(text("ANALYZE players"))
+    connection.execute(text("ANALYZE games"))
+    logging.info(f"Moved {moved} games onto integer player IDs.")
+
+
+def add_player_foreign_keys(connection):
+    """Makes the player columns of games reference players."""
+    for name in PLAYER_COLUMNS:
+        connection.execute(text(
+            f"ALTER TABLE games ADD CONSTRAINT games_{name}_fkey FOREIGN KEY ({name}) REFERENCES players (player_id)"
+        ))
+
+
+def add_player_games(connection):
+    """Creates the per-player projection of games and fills it from the stored games.
+
+    Scores come from the PGN Result tag, so draws count as half a point; games without a PGN
+    fall back to the winner column.
+    """
+    connection.execute(text(f"""
+        CREATE TABLE player_games (
+            player_id INTEGER NOT NULL REFERENCES players (player_id),
+            date_time DATE NOT NULL,
+            game_id TEXT NOT NULL,
+            color TEXT NOT NULL,
+            rating INTEGER,
+            opponent_id INTEGER REFERENCES players (player_id),
+            opponent_rating INTEGER,
+            score REAL,
+            time_class TEXT,
+            PRIMARY KEY ({', '.join(PLAYER_GAME_KEY)})
+        ) PARTITION BY RANGE (date_time)
+    """))
+    months = connection.execute(text("SELECT DISTINCT date_time FROM games")).scalars()
+    ensure_partitions(connection, list(months))
+
+    white_score = r"""
+        COALESCE(
+            CASE SUBSTRING(p.pgn FROM '\[Result "([^"]*)"\]')
+                WHEN '1-0' THEN 1.0 WHEN '0-1' THEN 0.0 WHEN '1/2-1/2' THEN 0.5
+            END,
+            CASE WHEN g.winner = g.white_player_id THEN 1.0 ELSE 0.0 END
+        )
+    """
+    columns = ", ".join(PLAYER_GAME_COLUMNS)
+    added = connection.execute(text(f"""
+        INSERT INTO player_games ({columns})
+        SELECT g.white_player_id, g.date_time, g.game_id, 'white', g.white_rating,
+               g.black_player_id, g.black_rating, {white_score}, g.time_class
+        FROM games g LEFT JOIN game_pgn p USING (game_id, date_time)
+        UNION ALL
+        SELECT g.black_player_id, g.date_time, g.game_id, 'black', g.black_rating,
+               g.white_player_id, g.white_rating, 1.0 - {white_score}, g.time_class
+        FROM games g LEFT JOIN game_pgn p USING (game_id, date_time)
+        ON CONFLICT DO NOTHING
+    """)).rowcount
+    connection.execute(text("ANALYZE player_games"))
+    logging.info(f"Added {added} player-game rows.")
+
+
+def add_summaries(connection):
+    """Creates the per-player and per-pairing summary tables and fills them from player_games."""
+    connection.execute(text(CREATE_PLAYER_SUMMARY))
+    connection.execute(text(CREATE_PAIRING_SUMMARY))
+    players, pairings = rebuild_summaries(connection)
+    logging.info(f"Summarized {players} players and {pairings} pairings.")
+
+
+def add_game_raw(connection):
+    """Creates game_raw: each game's full archive object, with typed columns generated from it.
+
+    It starts empty for games loaded before; rebuild_from_archives.py fills it from the saved
+    archives, without touching the network.
+    """
+    sqlite = is_sqlite(connection)
+    fields = ",\n".join(raw_field_sql(connection, name) for name in INITIAL_RAW_FIELDS)
+    connection.execute(text(f"""
+        CREATE TABLE game_raw (
+            game_id TEXT NOT NULL,
+            date_time DATE NOT NULL,
+            raw {'TEXT' if sqlite else 'JSONB'} NOT NULL,
+            {fields},
+            PRIMARY KEY ({', '.join(GAME_KEY)})
+        ) {'' if sqlite else 'PARTITION BY RANGE (date_time)'}
+    """))
+    if not sqlite:
+        months = connection.execute(text("SELECT DISTINCT date_time FROM games")).scalars()
+        ensure_partitions(connection, list(months))
+
+
+def add_opening_index(connection):
+    """Creates the openings dimension and gives games and player_games an indexed opening_id.
+
+    Every stored game's ECO and ECOUrl headers are read from game_pgn once, here, so the
+    reports never parse a PGN for its opening again.
+    """
+    sqlite = is_sqlite(connection)
+    connection.execute(text(f"""
+        CREATE TABLE openings (
+            opening_id {'INTEGER PRIMARY KEY' if sqlite else 'INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY'},
+            eco_url TEXT NOT NULL UNIQUE,
+            eco TEXT,
+            family TEXT NOT NULL,
+            variation TEXT
+        )
+    """))
+    for table in ("games", "player_games"):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN opening_id INTEGER REFERENCES openings (opening_id)"))
+
+    ecos, game_urls = {}, []
+    pgns = text("SELECT game_id, pgn FROM game_pgn").execution_options(yield_per=BACKFILL_CHUNK_SIZE)
+    for game_id, pgn in connection.execute(pgns):
+        headers = parse_pgn_headers(pgn or "")
+        eco_url = headers.get("ECOUrl")
+        if eco_url:
+            ecos.setdefault(eco_url, headers.get("ECO"))
+            game_urls.append((game_id, eco_url))
+    if ecos:
+        ids = add_openings(connection, ecos)
+        rows = [{"game_id": game_id, "opening_id": ids[eco_url]} for game_id, eco_url in game_urls]
+        for table in ("games", "player_games"):
+            update_rows(connection, table, rows, "game_id", ["opening_id"])
+
+    for name, definition in OPENING_INDEXES.items():
+        if sqlite:
+            # No INCLUDE in SQLite: the included columns become trailing key columns instead
+            definition = definition.replace(") INCLUDE (", ", ")
+        connection.execute(text(f"CREATE INDEX {name} ON {definition}"))
+    for table in ("openings", "games", "player_games"):
+        connection.execute(text(f"ANALYZE {table}"))
+    logging.info(f"Indexed {len(game_urls)} games under {len(ecos)} openings.")
+
+
+def add_final_position(connection):
+    """Adds each game's final position (FEN) to game_raw, generated from the JSON already stored."""
+    add_raw_field(connection, "fen")
+
+
+# (version, description, function); append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, "games table with typed columns", create_games),
+    (2, "primary key on games.game_id", add_games_primary_key),
+    (3, "per-player date indexes on games", add_games_indexes),
+    (4, "games partitioned by month of date_time", partition_games),
+    (5, "PGN text moved from games to game_pgn", split_pgn),
+    (6, "players dimension; games reference players by integer ID", add_players),
+    (7, "player_games: each game from each player's side", add_player_games),
+    (8, "player and pairing summaries for the reports", add_summaries),
+    (9, "game_raw: full game JSON with generated columns", add_game_raw),
+    (10, "openings dimension; games and player_games indexed by opening", add_opening_index),
+    (11, "game_raw.fen: final position, generated from the raw JSON", add_final_position),
+]
+
+
+def current_version(connection):
+    """Returns the newest applied migration (0 for a new database)."""
+    connection.execute(CREATE_SCHEMA_VERSION)
+    return connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def migrate(engine, target=None):
+    """Applies pending migrations (up to `target`, default all), in order, in one transaction; returns the schema version."""
+    with engine.begin() as connection:
+        if not is_sqlite(connection):
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        version = current_version(connection)
+        if version == 0 and is_sqlite(connection):
+            for statement in sqlite_schema():
+                connection.execute(text(statement))
+            for number, description, _ in MIGRATIONS[:SQLITE_BASELINE]:
+                connection.execute(
+                    text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                    {"version": number, "description": description},
+                )
+            version = SQLITE_BASELINE
+            logging.info(f"Created the SQLite schema at version {version}.")
+        for number, description, apply in MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+            logging.info(f"Applying schema migration {number}: {description}")
+            apply(connection)
+            connection.execute(
+                text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                {"version": number, "description": description},
+            )
+            version = number
+    return version
+
+
+def explain(connection, query, params):
+    """Runs EXPLAIN ANALYZE on a query; returns (execution ms, plan lines)."""
+    plan = [row[0] for row in connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {query}"), params)]
+    match = re.search(r"Execution Time: ([\d.]+) ms", plan[-1])
+    return float(match.group(1)) if match else float("nan"), plan
+
+
+def query_tables(query):
+    """Returns the tables a report query reads, from its FROM and JOIN clauses."""
+    return set(QUERY_TABLE_PATTERN.findall(query))
+
+
+def drop_keys_and_indexes(connection, tables):
+    """Drops the keys and indexes of these tables, with the foreign keys that depend on them.
+
+    Meant for a transaction that is rolled back; the tables stay locked until then.
+    """
+    constraints = connection.execute(text("""
+        SELECT t.relname, c.conname
+        FROM pg_constraint c
+        JOIN pg_class t ON t.oid = c.conrelid
+        WHERE t.relname = ANY(:tables) AND t.relnamespace = current_schema()::regnamespace
+          AND c.contype IN ('p', 'u') AND c.conparentid = 0
+    """), {"tables": list(tables)}).all()
+    for table, name in constraints:
+        connection.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name} CASCADE"))
+    # Indexes of partitions go with their parent's index
+    indexes = connection.execute(text("""
+        SELECT i.relname
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        WHERE t.relname = ANY(:tables) AND t.relnamespace = current_schema()::regnamespace
+          AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = i.oid)
+    """), {"tables": list(tables)}).scalars().all()
+    for name in indexes:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def explain_queries(engine, queries, params, without_indexes=False):
+    """Explains each query; with without_indexes, inside a rolled-back transaction that first drops
+    the keys and indexes of the tables the queries read.
+    """
+    results = {}
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            if without_indexes:
+                drop_keys_and_indexes(connection, set().union(*map(query_tables, queries.values())))
+            for name, query in queries.items():
+                results[name] = explain(connection, query, params)
+            transaction.rollback()
+    return results
+
+
+def partitions_scanned(plan):
+    """Counts the distinct partitions a plan touches, to check that date filters prune."""
+    return len(set(re.findall(r"\bon (\w+_y\d{4}m\d{2})\b", "\n".join(plan))))
+
+
+def list_partitions(connection):
+    """Returns (name, parent, month, estimated rows, total bytes) of every attached partition."""
+    rows = connection.execute(text("""
+        SELECT c.relname, c.reltuples::BIGINT, pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE parent.relname = ANY(:tables)
+    """), {"tables": list(PARTITIONED_TABLES)}).all()
+    partitions = []
+    for name, count, size in rows:
+        parsed = parse_partition(name)
+        if parsed:
+            partitions.append((name, parsed[0], parsed[1], max(count, 0), size))
+    return sorted(partitions, key=lambda p: (p[2], PARTITIONED_TABLES.index(p[1])))
+
+
+def old_partitions(connection, before):
+    """Returns (name, parent) of the partitions of months before `before` (a date), in every table."""
+    return [(name, parent) for name, parent, month, _, _ in list_partitions(connection) if month < before]
+
+
+def detach_partitions(engine, before):
+    """Detaches the partitions before a month; they stay as plain tables, out of every query.
+
+    Each is renamed to {name}_detached, so a later load of games from that month can create
+    its partition again. Their games are taken out of the summaries as well, in the same
+    transaction.
+    """
+    with engine.begin() as connection:
+        partitions = old_partitions(connection, before)
+        for name, parent in partitions:
+            if parent == "player_games":
+                add_to_summaries(connection, name, sign=-1)
+            connection.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name}"))
+            connection.execute(text(f"ALTER TABLE {name} RENAME TO {name}{DETACHED_SUFFIX}"))
+            logging.info(f"Detached {name} as {name}{DETACHED_SUFFIX}.")
+    with known_partitions_lock:
+        known_partitions.difference_update(name for name, _ in partitions)
+    return [name for name, _ in partitions]
+
+
+def archive_partitions(engine, before, out_dir):
+    """Exports the partitions before a month to gzipped CSV files, then drops them."""
+    os.makedirs(out_dir, exist_ok=True)
+    archived = []
+    with engine.begin() as connection:
+        cursor = connection.connection.cursor()
+        for name, parent in old_partitions(connection, before):
+            path = os.path.join(out_dir, f"{name}.csv.gz")
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+                cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+            if parent == "player_games":
+                add_to_summaries(connection, name, sign=-1)
+            connection.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+            archived.append(name)
+            logging.info(f"Archived {name} to {path} ({os.path.getsize(path) / 1e6:.1f} MB).")
+        cursor.close()
+    with known_partitions_lock:
+        known_partitions.difference_update(archived)
+    return archived
+
+
+def restore_partition(engine, path):
+    """Loads a partition exported by archive_partitions back into its table; returns the rows loaded."""
+    name = os.path.basename(path).split(".")[0]
+    parsed = parse_partition(name)
+    if parsed is None:
+        raise ValueError(f"{path} is not an archived partition")
+    with engine.begin() as connection:
+        ensure_partitions(connection, [parsed[1]])
+        cursor = connection.connection.cursor()
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+            cursor.copy_expert(f"COPY {name} FROM STDIN WITH (FORMAT csv, HEADER)", f)
+        count = cursor.rowcount
+        cursor.close()
+        if parsed[0] == "player_games":
+            add_to_summaries(connection, name)
+    logging.info(f"Restored {count} rows into {name}.")
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Versioned schema of the chess database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="apply pending migrations")
+    migrate_parser.add_argument("--to", dest="target", type=int, default=None, help="stop at this version")
+    subparsers.add_parser("status", help="show applied migrations")
+    explain_parser = subparsers.add_parser("explain", help="EXPLAIN ANALYZE the report queries with and without the indexes")
+    explain_parser.add_argument("--player", default="hikaru", help="player for the per-player query")
+    explain_parser.add_argument("--start", default="2020-01-01", help="first day for the date range query")
+    explain_parser.add_argument("--end", default="2020-04-01", help="day after the date range query")
+    explain_parser.add_argument("--plans", action="store_true", help="print the full plans")
+    subparsers.add_parser("partitions", help="list the monthly partitions of games")
+    for command, help_text in (("detach", "detach partitions older than a month"),
+                               ("archive", "export partitions older than a month to CSV and drop them")):
+        old_parser = subparsers.add_parser(command, help=help_text)
+        old_parser.add_argument("--before", required=True, help="first month to keep, YYYY-MM")
+        if command == "archive":
+            old_parser.add_argument("--to", dest="out_dir", default="archived_partitions", help="output directory")
+    restore_parser = subparsers.add_parser("restore", help="load archived partition files back into games")
+    restore_parser.add_argument("files", nargs="+", help="games_yYYYYmMM.csv.gz files")
+    args = parser.parse_args()
+
+    # Imported here so the module itself stays free of a database connection
+    from analyze_data import QUERIES
+    from db import engine
+
+    if args.command not in ("migrate", "status") and is_sqlite(engine):
+        parser.error(f"'{args.command}' works on PostgreSQL only; SQLite tables are not partitioned.")
+
+    if args.command == "migrate":
+        logging.info(f"Schema is at version {migrate(engine, args.target)}.")
+    elif args.command == "status":
+        with engine.connect() as connection:
+            current_version(connection)
+            applied = connection.execute(text("SELECT version, description, applied_at FROM schema_version ORDER BY version")).all()
+        for version, description, applied_at in applied:
+            print(f"{version:>3}  {str(applied_at)[:16]}  {description}")
+        pending = [number for number, _, _ in MIGRATIONS if number > (applied[-1][0] if applied else 0)]
+        print(f"Pending: {pending or 'none'}")
+    elif args.command == "explain":
+        params = {"player": args.player, "start": args.start, "end": args.end}
+        before = explain_queries(engine, QUERIES, params, without_indexes=True)
+        after = explain_queries(engine, QUERIES, params)
+        print(f"{'query':<15} {'before ms':>10} {'after ms':>10} {'speedup':>8} {'partitions':>11}")
+        for name in QUERIES:
+            before_ms, after_ms = before[name][0], after[name][0]
+            print(
+                f"{name:<15} {before_ms:>10.2f} {after_ms:>10.2f} {before_ms / after_ms if after_ms else 0:>7.1f}x "
+                f"{partitions_scanned(after[name][1]):>11}"
+            )
+        if args.plans:
+            for name in QUERIES:
+                print(f"\n--- {name} (without indexes)\n" + "\n".join(before[name][1]))
+                print(f"\n--- {name} (with indexes)\n" + "\n".join(after[name][1]))
+    elif args.command == "partitions":
+        with engine.connect() as connection:
+            partitions = list_partitions(connection)
+        for name, parent, month, count, size in partitions:
+            print(f"{name:<20} {count:>10} rows {size / 1e6:>9.1f} MB")
+        for table in PARTITIONED_TABLES:
+            sizes = [p[4] for p in partitions if p[1] == table]
+            print(f"{table}: {len(sizes)} partitions, {sum(sizes) / 1e6:.1f} MB")
+    elif args.command in ("detach", "archive"):
+        before = month_start(f"{args.before}-01")
+        if args.command == "detach":
+            names = detach_partitions(engine, before)
+        else:
+            names = archive_partitions(engine, before, args.out_dir)
+        logging.info(f"{'Detached' if args.command == 'detach' else 'Archived'} {len(names)} partitions before {args.before}.")
+    elif args.command == "restore":
+        for path in args.files:
+            restore_partition(engine, path)
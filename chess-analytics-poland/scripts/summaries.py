@@ -0,0 +1,162 @@
+import argparse
+import logging
+import sys
+import time
+
+from sqlalchemy import text
+
+from db import create_temporary_table, empty_tables
+
+# Running totals per player and per (white, black) pairing, read by the reports instead of
+# scanning every game. All of them are sums, so new games are added without rescanning.
+PLAYER_SUMMARY_COLUMNS = ["player_id", "white_games", "black_games", "wins", "draws", "losses",
+                          "rating_sum", "opponent_rating_sum"]
+PAIRING_SUMMARY_COLUMNS = ["white_player_id", "black_player_id", "games", "white_rating_sum",
+                           "black_rating_sum", "white_wins", "draws", "black_wins"]
+
+# Temporary table collecting the player_games rows a transaction inserted
+NEW_PLAYER_GAMES = "new_player_games"
+
+# The summaries computed from any table shaped like player_games ({source})
+PLAYER_AGGREGATE = """
+    SELECT player_id,
+           COUNT(*) FILTER (WHERE color = 'white') AS white_games,
+           COUNT(*) FILTER (WHERE color = 'black') AS black_games,
+           COUNT(*) FILTER (WHERE score = 1) AS wins,
+           COUNT(*) FILTER (WHERE score = 0.5) AS draws,
+           COUNT(*) FILTER (WHERE score = 0) AS losses,
+           COALESCE(SUM(rating), 0) AS rating_sum,
+           COALESCE(SUM(opponent_rating), 0) AS opponent_rating_sum
+    FROM {source}
+    GROUP BY player_id
+"""
+
+# Each game once, from white's side
+PAIRING_AGGREGATE = """
+    SELECT player_id AS white_player_id,
+           opponent_id AS black_player_id,
+           COUNT(*) AS games,
+           COALESCE(SUM(rating), 0) AS white_rating_sum,
+           COALESCE(SUM(opponent_rating), 0) AS black_rating_sum,
+           COUNT(*) FILTER (WHERE score = 1) AS white_wins,
+           COUNT(*) FILTER (WHERE score = 0.5) AS draws,
+           COUNT(*) FILTER (WHERE score = 0) AS black_wins
+    FROM {source}
+    WHERE color = 'white'
+    GROUP BY player_id, opponent_id
+"""
+
+SUMMARIES = (
+    ("player_summary", PLAYER_SUMMARY_COLUMNS, 1, PLAYER_AGGREGATE),
+    ("pairing_summary", PAIRING_SUMMARY_COLUMNS, 2, PAIRING_AGGREGATE),
+)
+
+
+def add_to_summaries(connection, source, sign=1):
+    """Adds the games of a player_games-shaped table (or partition) to the summaries.
+
+    With sign=-1 the games are taken out instead, e.g. before their partition is detached.
+    Rows are upserted in key order, so concurrent loaders lock summary rows in the same order.
+    """
+    for table, columns, key_length, aggregate in SUMMARIES:
+        column_list = ", ".join(columns)
+        key_list = ", ".join(columns[:key_length])
+        values = columns[key_length:]
+        selected = ", ".join([*columns[:key_length], *(f"{sign} * {column}" for column in values)])
+        assignments = ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in values)
+        connection.execute(text(f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {selected}
+            FROM ({aggregate.format(source=source)}) AS totals
+            WHERE true
+            ORDER BY {key_list}
+            ON CONFLICT ({key_list}) DO UPDATE SET {assignments}
+        """))
+    if sign < 0:
+        connection.execute(text("DELETE FROM player_summary WHERE white_games + black_games = 0"))
+        connection.execute(text("DELETE FROM pairing_summary WHERE games = 0"))
+
+
+def stage_new_games(connection):
+    """Creates the temporary table that merge_rows copies newly inserted player_games rows into."""
+    create_temporary_table(connection, NEW_PLAYER_GAMES, "SELECT * FROM player_games")
+
+
+def apply_new_games(connection):
+    """Adds the games staged in this transaction to the summaries; call once, just before commit.
+
+    One upsert per transaction (rather than per chunk) keeps the summary row locks short and
+    taken in a single, sorted pass.
+    """
+    stage_new_games(connection)
+    add_to_summaries(connection, NEW_PLAYER_GAMES)
+    empty_tables(connection, NEW_PLAYER_GAMES)
+
+
+def rebuild_summaries(connection):
+    """Recomputes the summaries from every stored game; returns (players, pairings)."""
+    empty_tables(connection, "player_summary", "pairing_summary")
+    add_to_summaries(connection, "player_games")
+    connection.execute(text("ANALYZE player_summary"))
+    connection.execute(text("ANALYZE pairing_summary"))
+    return tuple(
+        connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table, *_ in SUMMARIES
+    )
+
+
+def check_summaries(connection):
+    """Compares the summaries with a full scan of player_games; returns {table: mismatching rows}.
+
+    A mismatching row is a key whose stored totals differ from the recomputed ones, or a key
+    present on one side only.
+    """
+    mismatches = {}
+    for table, columns, key_length, aggregate in SUMMARIES:
+        column_list = ", ".join(columns)
+        key_list = ", ".join(columns[:key_length])
+        rows = connection.execute(text(f"""
+            WITH stored AS (SELECT {column_list} FROM {table}),
+                 scanned AS ({aggregate.format(source="player_games")}),
+                 only_stored AS (SELECT * FROM stored EXCEPT SELECT * FROM scanned),
+                 only_scanned AS (SELECT * FROM scanned EXCEPT SELECT * FROM stored)
+            SELECT {key_list} FROM only_stored
+            UNION
+            SELECT {key_list} FROM only_scanned
+            ORDER BY {key_list}
+        """)).all()
+        mismatches[table] = rows
+    return mismatches
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Summary tables behind the analyze_data reports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="recompute the summaries from every stored game")
+    subparsers.add_parser("check", help="compare the summaries with a full scan (exit code 1 on mismatch)")
+    args = parser.parse_args()
+
+    # Imported here so the module itself stays free of a database connection
+    from db import engine
+    from schema import migrate
+
+    migrate(engine)
+    start = time.perf_counter()
+    if args.command == "rebuild":
+        with engine.begin() as connection:
+            players, pairings = rebuild_summaries(connection)
+        logging.info(f"Rebuilt the summaries: {players} players, {pairings} pairings "
+                     f"in {time.perf_counter() - start:.2f}s.")
+    elif args.command == "check":
+        with engine.connect() as connection:
+            mismatches = check_summaries(connection)
+        elapsed = time.perf_counter() - start
+        for table, rows in mismatches.items():
+            for row in rows[:20]:
+                logging.warning(f"{table}: totals of {tuple(row)} differ from a full scan.")
+            if len(rows) > 20:
+                logging.warning(f"{table}: ... and {len(rows) - 20} more.")
+        if any(mismatches.values()):
+            logging.error(f"Summaries are out of date ({elapsed:.2f}s); run 'summaries.py rebuild'.")
+            sys.exit(1)
+        logging.info(f"Summaries match a full scan ({elapsed:.2f}s).")